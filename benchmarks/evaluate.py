@@ -0,0 +1,102 @@
+"""
+Times preparing and evaluating a table of formulas over synthetic actives: pairwise
+merge_dfs (the old Evaluator/prepare_actives path) versus one aligned union index.
+
+    python benchmarks/evaluate.py [actives] [formulas] [dates]
+"""
+import datetime as dt
+import sys
+import time
+import numpy as np
+import pandas as pd
+from pyparsing import alphas
+
+from validol.model.resource_manager.atom_flavors import LazyAtom, FormulaAtom
+from validol.model.resource_manager.evaluator import Evaluator
+from validol.model.resource_manager.eval_cache import EVAL_CACHE
+from validol.model.resource_manager.resource_manager import ResourceManager
+from validol.model.utils.utils import merge_dfs, align_dfs, to_timestamp
+
+
+ATOMS = ['OI', 'VOL', 'SET']
+
+
+class BenchLauncher:
+    def get_atoms(self):
+        return [LazyAtom(name, [FormulaAtom.LETTER]) for name in ATOMS]
+
+
+class LegacyEvaluator(Evaluator):
+    def evaluate(self, formulas):
+        df = pd.DataFrame()
+
+        for formula in formulas:
+            result = self.parser.evaluate(formula)
+
+            if isinstance(result, pd.Series):
+                df = merge_dfs(df, result.to_frame(formula))
+            else:
+                df[formula] = result
+
+        return df.dropna(axis=0, how='all')
+
+
+def fixture(actives, dates):
+    last = dt.date.today()
+    all_dates = np.array([to_timestamp(last - dt.timedelta(days=i)) for i in range(dates * 2)])
+
+    dfs = []
+    for letter in alphas[:actives]:
+        index = np.sort(np.random.choice(all_dates, dates, replace=False))
+        df = pd.DataFrame({atom: np.random.rand(dates) for atom in ATOMS}, index=index)
+
+        dfs.append(ResourceManager.add_letter(df, letter))
+
+    return dfs, [dt.date.fromtimestamp(all_dates.min()), last]
+
+
+def formulas(actives, number):
+    letters = alphas[:actives]
+
+    return ['{a}({x}) {op} {b}({y})'.format(a=np.random.choice(ATOMS), b=np.random.choice(ATOMS),
+                                            x=letters[i % actives], y=letters[(i * 7 + 3) % actives],
+                                            op=np.random.choice(list('+-*/')))
+            for i in range(number)]
+
+
+def bench(f, *args):
+    EVAL_CACHE.clear()
+
+    start = time.perf_counter()
+    result = f(*args)
+
+    return time.perf_counter() - start, result
+
+
+def legacy(dfs, table, range):
+    df = pd.DataFrame()
+    for active_df in dfs:
+        df = merge_dfs(df, active_df)
+
+    return LegacyEvaluator(BenchLauncher(), df, {}, range).evaluate(table)
+
+
+def aligned(dfs, table, range):
+    return Evaluator(BenchLauncher(), align_dfs(dfs), {}, range).evaluate(table).df
+
+
+def main(actives=10, number=40, dates=5000):
+    dfs, range = fixture(actives, dates)
+    table = formulas(actives, number)
+
+    old_time, old = bench(legacy, dfs, table, range)
+    new_time, new = bench(aligned, dfs, table, range)
+
+    pd.testing.assert_frame_equal(old.sort_index(axis=1), new.sort_index(axis=1), check_dtype=False)
+
+    print('pairwise merge_dfs: {:.3f}s'.format(old_time))
+    print('aligned union index: {:.3f}s'.format(new_time))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
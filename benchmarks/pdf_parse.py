@@ -0,0 +1,41 @@
+"""
+Compares parse time of one CME daily bulletin section when tabula is called once per
+page against one batched call per page run.
+
+    python benchmarks/pdf_parse.py <section.pdf> <active name> [futures|options]
+"""
+import sys
+import time
+from copy import deepcopy
+from types import SimpleNamespace
+
+from validol.model.store.miners.daily_reports.pdf_helpers.cme import CmeFuturesParser, CmeOptionsParser
+from validol.model.utils.utils import pdf
+
+
+def per_page(config):
+    config = deepcopy(config)
+
+    for processor in config['processors']:
+        processor['batch'] = False
+
+    return config
+
+
+def main(fname, active, kind='futures'):
+    parser_cls = CmeFuturesParser if kind == 'futures' else CmeOptionsParser
+    parser = parser_cls(SimpleNamespace(name=SimpleNamespace(active=active), other_info={}))
+
+    with open(fname, 'rb') as file:
+        config, = parser.config(file.read())
+
+    print('{} pages'.format(len(config['pages'])))
+
+    for name, cfg in (('per page', per_page(config)), ('batched', config)):
+        begin = time.perf_counter()
+        df = pdf(fname, cfg)
+        print('{:>9}: {:.2f}s, {} rows'.format(name, time.perf_counter() - begin, len(df)))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
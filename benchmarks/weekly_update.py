@@ -0,0 +1,90 @@
+"""
+Times a CFTC weekly update (initial year load + one new report) against an in-memory
+fixture: the old per-active Active.update() path versus Flavor.process_flavor.
+
+    python benchmarks/weekly_update.py [actives] [weeks]
+"""
+import datetime as dt
+import sqlite3
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from validol.model.store.miners.weekly_reports.flavor import Flavor
+from validol.model.store.miners.weekly_reports.flavors import Cftc, CFTC_DISAGGREGATED_FUTURES_ONLY, \
+    fix_atoms
+from validol.model.store.miners.weekly_reports.active import Active, WeeklyActives
+from validol.model.store.resource import Platforms
+from validol.model.utils.utils import group_by
+
+
+FLAVOR = CFTC_DISAGGREGATED_FUTURES_ONLY
+
+
+class BenchLauncher:
+    def __init__(self):
+        self.main_dbh = sqlite3.connect(':memory:')
+
+
+def fixture(actives, weeks):
+    last = dt.date.today() - dt.timedelta(days=7)
+    dates = [last - dt.timedelta(weeks=i) for i in range(weeks)]
+
+    code, name = FLAVOR['keys']
+    df = pd.DataFrame([(str(i), 'ACTIVE {} - EXCHANGE {}'.format(i, i % 7), date)
+                       for i in range(actives) for date in dates],
+                      columns=[code, name, 'Date'])
+
+    for value in FLAVOR['values'].values():
+        if value != 'Date':
+            df[value] = np.random.randint(0, 100000, len(df)).astype(np.float64)
+
+    return fix_atoms(df)
+
+
+def per_active(launcher, df):
+    info = group_by(df, FLAVOR['keys'])
+
+    actives = {(code, tuple(Flavor.get_active_platform_name(name))) for code, name in info.groups.keys()}
+
+    Platforms(launcher, FLAVOR['name']).write_df(pd.DataFrame(
+        list({(code, platform) for code, (_, platform) in actives}),
+        columns=('PlatformCode', 'PlatformName')))
+    WeeklyActives(launcher, FLAVOR['name']).write_df(pd.DataFrame(
+        list({(code, active) for code, (active, _) in actives}),
+        columns=('PlatformCode', 'ActiveName')))
+
+    for code, name in info.groups.keys():
+        active_name, _ = Flavor.get_active_platform_name(name)
+        Active(launcher, FLAVOR, code, active_name, info.get_group((code, name))).update()
+
+
+def bulk(launcher, df):
+    Cftc(launcher).process_flavor(df, FLAVOR)
+
+
+def measure(f, df):
+    launcher = BenchLauncher()
+
+    history, update = df[df.Date != df.Date.max()], df[df.Date == df.Date.max()]
+
+    begin = time.perf_counter()
+    f(launcher, history)
+    middle = time.perf_counter()
+    f(launcher, update)
+    end = time.perf_counter()
+
+    return middle - begin, end - middle
+
+
+def main(actives=400, weeks=52):
+    df = fixture(actives, weeks)
+
+    for name, f in (('per active', per_active), ('bulk', bulk)):
+        initial, weekly = measure(f, df)
+        print('{:>10}: initial {:.2f}s, weekly update {:.3f}s'.format(name, initial, weekly))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
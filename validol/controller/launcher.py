@@ -1,9 +1,11 @@
 import traceback
+from functools import partial
 
 import pip
 
 from validol.setup_cfg import SETUP_CONFIG
 from validol.model.launcher import ModelLauncher
+from validol.model.resource_manager.evaluation_service import EvaluationTask
 from validol.model.store.view.view_flavor import ViewFlavor
 from validol.view.launcher import ViewLauncher
 
@@ -21,8 +23,21 @@ class ControllerLauncher:
         return self.model_launcher.update(how)
 
     def draw_table(self, table_pattern, actives):
+        actives = list(actives)
+        title = ViewFlavor.show_ais(actives, self.model_launcher)
+
+        task = EvaluationTask()
+        self.view_launcher.show_evaluation_progress(
+            task, title, partial(self.on_table_evaluated, table_pattern, title))
+
+        self.model_launcher.submit_tables(table_pattern, actives, task)
+
+    def on_table_evaluated(self, table_pattern, title, task):
+        if task.cancelled():
+            return
+
         try:
-            data = self.model_launcher.prepare_tables(table_pattern, actives)
+            data = task.result()
         except Exception:
             self.view_launcher.display_error(
                 'Table evaluation failed',
@@ -37,8 +52,6 @@ class ControllerLauncher:
                 "There is no data for configuration you've chosen so there is nothing to show")
             return
 
-        title = ViewFlavor.show_ais(actives, self.model_launcher)
-
         for i, labels in enumerate(table_pattern.formula_groups):
             self.view_launcher.show_table(data, labels, title)
 
@@ -78,6 +91,7 @@ class ControllerLauncher:
 
     def quit(self):
         self.view_launcher.quit()
+        self.model_launcher.shutdown()
 
     def notify_update(self, results):
         self.view_launcher.notify_update(results)
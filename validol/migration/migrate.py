@@ -4,6 +4,8 @@ from validol.migration.scripts.platforms_fix import main as zztn_main
 from validol.migration.scripts.preliminary_filter import main as zzt_main
 from validol.migration.scripts.expirations_source_fix import main as zztf_main
 from validol.migration.scripts.show import main as fty_main
+from validol.migration.scripts.ftp_blobs import main as ffn_main
+from validol.migration.scripts.ranges_backfill import main as ffnr_main
 from validol.model.utils.utils import map_version
 
 
@@ -17,7 +19,9 @@ MIGRATION_MAP = [
     ('0.0.29', zztn_main),
     ('0.0.30', zzt_main),
     ('0.0.34', zztf_main),
-    ('0.0.40', fty_main)
+    ('0.0.40', fty_main),
+    ('0.0.48', ffn_main),
+    ('0.0.48', ffnr_main)
 ]
 
 
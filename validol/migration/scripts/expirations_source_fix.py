@@ -10,7 +10,7 @@ from validol.model.store.miners.daily_reports.cme_flavors import CME_DAILY_FLAVO
 def main(model_launcher):
     copyfile('main.db', 'main.db.old')
 
-    model_launcher.main_dbh.cursor().execute('DROP TABLE IF EXISTS "Expirations"')
+    Expirations(model_launcher).drop()
 
     Expirations(model_launcher).update()
 
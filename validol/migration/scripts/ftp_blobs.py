@@ -0,0 +1,24 @@
+from sqlalchemy import MetaData, Table
+
+from validol.model.store.structures.ftp_cache import FtpCache
+
+
+def main(model_launcher):
+    engine = model_launcher.cache_engine
+
+    if not engine.has_table('ftp'):
+        return
+
+    ftp_cache = FtpCache(model_launcher)
+    table = Table('ftp', MetaData(), autoload=True, autoload_with=engine)
+
+    names = [name for name, in engine.execute(table.select().with_only_columns([table.c.name]))]
+
+    for name in names:
+        value = engine.execute(table.select().where(table.c.name == name)).fetchone().value
+        ftp_cache.write_value(name, value)
+
+    table.drop(engine)
+
+    with engine.connect() as connection:
+        connection.execute('VACUUM')
@@ -0,0 +1,21 @@
+import sqlite3
+
+from validol.model.store.resource import Ranges
+
+
+def main(model_launcher):
+    dbh = model_launcher.main_dbh
+    ranges = Ranges(dbh)
+
+    res = dbh.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()
+
+    for name, in res:
+        if name == ranges.table:
+            continue
+
+        try:
+            ranges.refresh(name)
+        except sqlite3.OperationalError:
+            pass
+
+    dbh.commit()
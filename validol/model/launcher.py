@@ -1,5 +1,6 @@
 import os
 import sqlite3
+from copy import copy
 from sqlalchemy import create_engine
 import socket
 import socks
@@ -8,6 +9,7 @@ import json
 from validol.model.store.view.composite_updater import DailyUpdater, EntireUpdater, UpdateManager
 from validol.model.store.view.view_flavors import ALL_VIEW_FLAVORS
 from validol.model.resource_manager.resource_manager import ResourceManager
+from validol.model.resource_manager.evaluation_service import EvaluationService
 from validol.model.store.miners.prices import InvestingPrices
 from validol.model.store.structures.atom import Atoms
 from validol.model.store.structures.pattern import Patterns, StrPattern
@@ -25,6 +27,7 @@ class ModelLauncher:
         self.controller_launcher = controller_launcher
 
     def init_user(self, user_db):
+        self.user_db = os.path.abspath(user_db)
         self.user_engine = create_engine('sqlite:///{}'.format(user_db))
         self.user_dbh = sqlite3.connect(user_db)
 
@@ -32,6 +35,21 @@ class ModelLauncher:
 
         return self
 
+    def connect_thread(self):
+        """
+        Returns a launcher with its own sqlite connections, to be used from one other thread
+        """
+        launcher = copy(self)
+        launcher.main_dbh = sqlite3.connect(self.main_db)
+        launcher.user_dbh = sqlite3.connect(self.user_db)
+        launcher.resource_manager = ResourceManager(launcher)
+
+        return launcher
+
+    def close_thread(self):
+        self.main_dbh.close()
+        self.user_dbh.close()
+
     def init_data(self, main_dbh="main.db", user_db='user.db', proxy_cfg='proxy.cfg'):
         data_exists = os.path.exists("data")
 
@@ -44,6 +62,7 @@ class ModelLauncher:
 
         self.init_user(user_db)
 
+        self.main_db = os.path.abspath(main_dbh)
         self.main_dbh = sqlite3.connect(main_dbh)
 
         self.cache_engine = create_engine('sqlite:///cache.sqlite')
@@ -58,6 +77,8 @@ class ModelLauncher:
 
         self.configure_proxy(proxy_cfg)
 
+        self.evaluation_service = EvaluationService(self)
+
         return self
 
     def configure_proxy(self, proxy_cfg):
@@ -130,8 +151,11 @@ class ModelLauncher:
     def remove_pattern(self, pattern):
         Patterns(self).remove(pattern)
 
-    def prepare_tables(self, table_pattern, actives_info):
-        return self.resource_manager.prepare_tables(table_pattern, actives_info)
+    def submit_tables(self, table_pattern, actives_info, task=None):
+        return self.evaluation_service.submit(table_pattern, actives_info, task)
+
+    def shutdown(self):
+        self.evaluation_service.shutdown()
 
     def write_pdf_helper(self, ai, info, other_info):
         PdfHelpers(self).write_helper(ai, info, other_info)
@@ -1,5 +1,11 @@
 import html
 import io
+import json
+import os
+import re
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from threading import local
 from zipfile import ZipFile, BadZipFile
 import requests
 from requests_cache import enabled
@@ -33,10 +39,8 @@ def url_reader(f):
     return wrapped
 
 
-@url_reader
-def read_url_text(response):
-    response.encoding = 'utf-8'
-    temp = response.text
+def unescape_text(content):
+    temp = content
     content = html.unescape(temp)
     while temp != content:
         temp = content
@@ -45,14 +49,194 @@ def read_url_text(response):
     return content
 
 
-@url_reader
-def read_url_one_filed_zip(response):
-    archive = response.content
-    file_like_archive = io.BytesIO(archive)
+class UnescapedFile(io.TextIOBase):
+    """
+    Text file with html entities unescaped line by line as it is read,
+    so a large csv is never held in memory as a whole
+    """
+    def __init__(self, infile):
+        self.infile = infile
+        self.pending = ''
+
+    def readable(self):
+        return True
+
+    def fill(self, size):
+        while size is None or size < 0 or len(self.pending) < size:
+            line = self.infile.readline()
+
+            if not line:
+                break
+
+            self.pending += unescape_text(line)
+
+    def take(self, size):
+        result, self.pending = self.pending[:size], self.pending[size:]
+
+        return result
+
+    def read(self, size=-1):
+        self.fill(size)
+
+        if size is None or size < 0:
+            size = len(self.pending)
+
+        return self.take(size)
+
+    def readline(self, size=-1):
+        if '\n' not in self.pending:
+            self.pending += unescape_text(self.infile.readline())
+
+        end = self.pending.find('\n') + 1 or len(self.pending)
 
+        if size is not None and 0 <= size < end:
+            end = size
+
+        return self.take(end)
+
+
+def unzip_one_filed(archive):
     try:
-        with ZipFile(file_like_archive, "r") as zip_file:
+        with ZipFile(io.BytesIO(archive), "r") as zip_file:
             path = zip_file.namelist()[0]
             return zip_file.read(path).decode('utf-8')
     except BadZipFile:
-        return None
\ No newline at end of file
+        return None
+
+
+@contextmanager
+def open_one_filed_zip(path):
+    try:
+        zip_file = ZipFile(path, "r")
+    except BadZipFile:
+        yield None
+        return
+
+    with zip_file, zip_file.open(zip_file.namelist()[0]) as raw:
+        yield io.TextIOWrapper(raw, encoding='utf-8')
+
+
+@url_reader
+def read_url_text(response):
+    response.encoding = 'utf-8'
+
+    return unescape_text(response.text)
+
+
+@url_reader
+def read_url_one_filed_zip(response):
+    return unzip_one_filed(response.content)
+
+
+class ArchiveDownloader:
+    """
+    Fetches archives concurrently into a local directory. Interrupted downloads are
+    resumed with a Range request, finished ones are revalidated with ETag/Last-Modified.
+    A finished archive and its .part keep their validators apart, the archive's ones
+    are replaced only together with the archive.
+    """
+    DIRECTORY = 'archives'
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, directory=DIRECTORY, max_workers=4):
+        self.directory = directory
+        self.max_workers = max_workers
+        self.local = local()
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+            self.local.session.headers['User-Agent'] = 'Mozilla/5.0'
+
+        return self.local.session
+
+    def path(self, url):
+        return os.path.join(self.directory, re.sub(r'[^\w.-]', '_', url))
+
+    def meta_path(self, url, part=False):
+        return self.path(url) + ('.part' if part else '') + '.json'
+
+    def read_meta(self, url, part=False):
+        try:
+            with open(self.meta_path(url, part), 'r') as infile:
+                return json.load(infile)
+        except (IOError, ValueError):
+            return {}
+
+    def write_meta(self, url, meta, part=False):
+        with open(self.meta_path(url, part), 'w') as outfile:
+            json.dump(meta, outfile)
+
+    @staticmethod
+    def validators(meta):
+        return [(header, meta[key]) for header, key in (('If-None-Match', 'etag'),
+                                                        ('If-Modified-Since', 'last_modified'))
+                if meta.get(key)]
+
+    def headers(self, url, revalidate):
+        path = self.path(url)
+        headers = {}
+
+        if os.path.isfile(path):
+            if revalidate:
+                headers.update(ArchiveDownloader.validators(self.read_meta(url)))
+        elif os.path.isfile(path + '.part'):
+            headers['Range'] = 'bytes={}-'.format(os.path.getsize(path + '.part'))
+
+            validators = ArchiveDownloader.validators(self.read_meta(url, part=True))
+            if validators:
+                headers['If-Range'] = validators[0][1]
+
+        return headers
+
+    def fetch(self, url, revalidate=True):
+        path = self.path(url)
+
+        if os.path.isfile(path) and not revalidate:
+            return path
+
+        headers = self.headers(url, revalidate)
+
+        with self.session.get(url, headers=headers, stream=True) as response:
+            if response.status_code == 304:
+                return path
+
+            if not response.ok:
+                return None
+
+            if response.status_code == 206:
+                mode = 'ab'
+            else:
+                mode = 'wb'
+
+                self.write_meta(url, {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')
+                }, part=True)
+
+            with open(path + '.part', mode) as outfile:
+                for chunk in response.iter_content(ArchiveDownloader.CHUNK_SIZE):
+                    outfile.write(chunk)
+
+        os.replace(path + '.part', path)
+
+        if os.path.isfile(self.meta_path(url, part=True)):
+            os.replace(self.meta_path(url, part=True), self.meta_path(url))
+
+        return path
+
+    def fetch_all(self, sources):
+        """
+        sources: iterable of (url, revalidate).
+        Yields local paths (None for failed downloads) in the order of sources as soon as
+        each one is ready, so the caller can process an archive while the next ones are
+        still downloading.
+        """
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            futures = [executor.submit(self.fetch, url, revalidate) for url, revalidate in sources]
+
+            for future in futures:
+                yield future.result()
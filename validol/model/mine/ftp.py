@@ -0,0 +1,106 @@
+import ftplib
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from queue import Queue, Empty
+
+
+class FtpPool:
+    """
+    Logged-in anonymous connections to one FTP server, shared between threads.
+    Idle connections are checked with NOOP before reuse, failed ones are dropped.
+    """
+    TIMEOUT = 60
+
+    def __init__(self, server, port=21, size=4, timeout=TIMEOUT):
+        self.server = server
+        self.port = port
+        self.size = size
+        self.timeout = timeout
+        self.connections = Queue()
+
+    def connect(self):
+        ftp = ftplib.FTP(timeout=self.timeout)
+        ftp.connect(self.server, self.port)
+        ftp.login()
+
+        return ftp
+
+    def acquire(self):
+        while True:
+            try:
+                ftp = self.connections.get_nowait()
+            except Empty:
+                return self.connect()
+
+            try:
+                ftp.voidcmd('NOOP')
+                return ftp
+            except ftplib.all_errors:
+                ftp.close()
+
+    @contextmanager
+    def connection(self):
+        ftp = self.acquire()
+
+        try:
+            yield ftp
+        except Exception:
+            ftp.close()
+            raise
+        else:
+            self.connections.put(ftp)
+
+    def run(self, f):
+        with self.connection() as ftp:
+            return f(ftp)
+
+    def listing(self, directory):
+        """
+        Returns {name: facts} of the regular files in directory, facts hold 'size' and
+        'modify' when the server reports them. One MLSD call where supported,
+        NLST + SIZE otherwise.
+        """
+        def mlsd(ftp):
+            return {name: facts for name, facts in ftp.mlsd(directory, ['type', 'size', 'modify'])
+                    if facts.get('type') == 'file'}
+
+        def nlst(ftp):
+            ftp.voidcmd('TYPE I')
+            files = {}
+
+            for path in ftp.nlst(directory):
+                name = path.rsplit('/', 1)[-1]
+                try:
+                    files[name] = {'size': str(ftp.size('/'.join((directory.rstrip('/'), name))))}
+                except ftplib.error_perm:
+                    pass
+
+            return files
+
+        try:
+            return self.run(mlsd)
+        except ftplib.error_perm:
+            return self.run(nlst)
+
+    def retrieve(self, path, callback):
+        return self.run(lambda ftp: ftp.retrbinary('RETR {}'.format(path), callback))
+
+    def map(self, f, items):
+        """
+        Applies f to items in up to size threads, the pool connections are shared
+        """
+        with ThreadPoolExecutor(self.size) as executor:
+            return list(executor.map(f, items))
+
+    def close(self):
+        while True:
+            try:
+                self.connections.get_nowait().close()
+            except Empty:
+                return
+
+
+@lru_cache()
+def ftp_pool(server, port=21):
+    return FtpPool(server, port)
@@ -1,12 +1,14 @@
-from itertools import groupby
 from sqlalchemy import Column, String, orm
 import pandas as pd
 import numpy as np
 
 from validol.model.store.miners.monetary import Monetary
+from validol.model.store.resource import Ranges
 from validol.model.store.structures.structure import Base, JSONCodec
 from validol.model.resource_manager.atom_base import AtomBase, rangable
+from validol.model.resource_manager.eval_cache import EVAL_CACHE, MISS
 from validol.model.utils.utils import to_timestamp, merge_dfs_list, FillSeries
+from validol.model.utils.curves import Curves
 
 
 class Currable:
@@ -74,23 +76,37 @@ class FormulaAtom(Base, AtomBase):
 
 
 class MBDeltaAtom(AtomBase):
+    """
+    Every step of the monetary base is spread evenly over the dates it lasts.
+    Results are kept in EVAL_CACHE per range until the Monetary table changes.
+    """
     def __init__(self):
         AtomBase.__init__(self, "MBDelta", [])
 
+    @staticmethod
+    def deltas(mbase):
+        values = mbase.values
+
+        if not len(values):
+            return pd.Series(index=mbase.index, dtype=np.float64)
+
+        starts = np.flatnonzero(np.r_[True, np.diff(values) != 0])
+        lengths = np.diff(np.r_[starts, len(values)])
+        steps = np.diff(np.r_[values[0], values[starts]]) / lengths
+
+        return pd.Series(np.repeat(steps, lengths), index=mbase.index)
+
     @rangable
     def evaluate(self, evaluator, params):
-        mbase = MonetaryAtom().evaluate(evaluator, params)
-
-        grouped_mbase = [(mbase.iloc[0], 1)] + [(k, len(list(g))) for k, g in groupby(mbase)]
-        deltas = []
-        for i in range(1, len(grouped_mbase)):
-            k, n = grouped_mbase[i]
-            delta = k - grouped_mbase[i - 1][0]
+        monetary = Monetary(evaluator.model_launcher)
+        key = self.name, tuple(evaluator.range), Ranges.table_version(monetary.table)
 
-            for j in range(n):
-                deltas.append(delta / n)
+        result = EVAL_CACHE.get(key)
+        if result is MISS:
+            result = MBDeltaAtom.deltas(monetary.read_dates_dt(*evaluator.range).MBase)
+            EVAL_CACHE.put(key, result)
 
-        return pd.Series(deltas, index=mbase.index)
+        return result
 
 
 class Apply(AtomBase):
@@ -146,31 +162,15 @@ class ArgMin(AtomBase):
         AtomBase.__init__(self, 'ARGMIN', ['series of series'])
 
     def evaluate(self, evaluator, params):
-        return params[0].apply(lambda curve: curve.argmin())
+        return Curves.of(params[0]).argmin()
 
 
 class Quantile(AtomBase):
     def __init__(self):
         AtomBase.__init__(self, 'QUANTILE', ['series of series', 'quantile', 'min or max'])
 
-    @staticmethod
-    def get_quantile(series, q, minmax):
-        argmin = series.argmin()
-
-        ml = series[argmin] * (1 + q)
-
-        if minmax == 'min':
-            series = series.loc[:argmin].iloc[::-1]
-        else:
-            series = series.loc[argmin:]
-
-        if len(series) < 2:
-            return np.NaN
-
-        return np.interp(ml, series.values, series.index)
-
     def evaluate(self, evaluator, params):
-        return params[0].apply(lambda curve: Quantile.get_quantile(curve, params[1], params[2]))
+        return Curves.of(params[0]).quantile(params[1], params[2])
 
 
 class Min(AtomBase):
@@ -178,7 +178,7 @@ class Min(AtomBase):
         AtomBase.__init__(self, 'MIN', ['series of series'])
 
     def evaluate(self, evaluator, params):
-        return params[0].apply(lambda curve: curve.min())
+        return Curves.of(params[0]).min()
 
 
 class Expirations(AtomBase):
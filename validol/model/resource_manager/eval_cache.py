@@ -0,0 +1,107 @@
+import hashlib
+import sys
+from collections import OrderedDict
+from threading import Lock
+import pandas as pd
+
+from validol.model.store.resource import Ranges
+from validol.model.utils.utils import FillSeries
+from validol.model.utils.curves import Curves
+
+
+UNCACHEABLE = object()
+MISS = object()
+
+
+def normalize_param(param):
+    if param is None or isinstance(param, (str, float)):
+        return param
+    elif isinstance(param, pd.Series) and not isinstance(param, FillSeries) and param.dtype != object:
+        digest = hashlib.sha1(pd.util.hash_pandas_object(param).values.tobytes()).hexdigest()
+
+        return 'series', param.name, str(param.dtype), digest
+    else:
+        return UNCACHEABLE
+
+
+def size_of(value):
+    if isinstance(value, Curves):
+        return value.nbytes()
+    elif isinstance(value, (pd.Series, pd.DataFrame)):
+        size = int(pd.Series(value.memory_usage(index=True)).sum())
+
+        if isinstance(value, pd.Series) and value.dtype == object:
+            size += sum(size_of(item) for item in value.values if isinstance(item, pd.Series))
+
+        return size
+    else:
+        return sys.getsizeof(value)
+
+
+class EvalCache:
+    """
+    Atom results shared by all evaluators of the process, least recently used ones are
+    evicted above max_bytes. Any write to a data table (Ranges.version) drops everything.
+    """
+    MAX_BYTES = 256 << 20
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()
+        self.size = 0
+        self.version = Ranges.version
+        self.lock = Lock()
+
+    @staticmethod
+    def key(atom, params, evaluator):
+        params = tuple(map(normalize_param, params))
+
+        if any(param is UNCACHEABLE for param in params):
+            return None
+
+        return atom.name, atom.description, params, evaluator.identity, tuple(evaluator.range), \
+            Ranges.version
+
+    def check_version(self):
+        if self.version != Ranges.version:
+            self.items.clear()
+            self.size = 0
+            self.version = Ranges.version
+
+    def get(self, key):
+        with self.lock:
+            self.check_version()
+
+            if key not in self.items:
+                return MISS
+
+            self.items.move_to_end(key)
+
+            return self.items[key][0]
+
+    def put(self, key, value):
+        size = size_of(value)
+
+        with self.lock:
+            self.check_version()
+
+            if size > self.max_bytes:
+                return
+
+            if key in self.items:
+                self.size -= self.items.pop(key)[1]
+
+            self.items[key] = value, size
+            self.size += size
+
+            while self.size > self.max_bytes:
+                _, (_, item_size) = self.items.popitem(last=False)
+                self.size -= item_size
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.size = 0
+
+
+EVAL_CACHE = EvalCache()
@@ -0,0 +1,96 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock
+
+
+class EvaluationCancelled(Exception):
+    pass
+
+
+class EvaluationTask:
+    """
+    A table evaluation running in the background. Callbacks are added before the task
+    is submitted and are called from the worker threads, the GUI has to pass them on
+    to its own thread.
+    """
+    def __init__(self):
+        self.future = None
+        self.cancel_event = Event()
+        self.lock = Lock()
+        self.progress_callbacks = []
+        self.done_callbacks = []
+        self.done = 0
+        self.total = 0
+
+    def cancel(self):
+        self.cancel_event.set()
+
+        if self.future is not None:
+            self.future.cancel()
+
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check(self):
+        if self.cancelled():
+            raise EvaluationCancelled
+
+    def add_progress_callback(self, callback):
+        self.progress_callbacks.append(callback)
+
+    def add_done_callback(self, callback):
+        self.done_callbacks.append(callback)
+
+    def finish(self, future):
+        for callback in self.done_callbacks:
+            callback(self)
+
+    def set_total(self, total):
+        with self.lock:
+            self.total = total
+
+        self.report()
+
+    def step(self):
+        with self.lock:
+            self.done += 1
+
+        self.report()
+
+    def report(self):
+        for callback in self.progress_callbacks:
+            callback(self.done, self.total)
+
+    def result(self):
+        return self.future.result()
+
+
+class EvaluationService:
+    """
+    Evaluates tables in worker threads, each run gets its own database connections,
+    so several tables can be in flight while the GUI stays responsive
+    """
+    WORKERS = 2
+
+    def __init__(self, model_launcher, workers=WORKERS):
+        self.model_launcher = model_launcher
+        self.executor = ThreadPoolExecutor(workers)
+
+    def submit(self, table_pattern, actives_info, task=None):
+        task = task or EvaluationTask()
+        task.future = self.executor.submit(self.run, table_pattern, list(actives_info), task)
+        task.future.add_done_callback(task.finish)
+
+        return task
+
+    def run(self, table_pattern, actives_info, task):
+        task.check()
+
+        launcher = self.model_launcher.connect_thread()
+
+        try:
+            return launcher.resource_manager.prepare_tables(table_pattern, actives_info, task)
+        finally:
+            launcher.close_thread()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -2,10 +2,16 @@ import numpy as np
 import operator
 import pandas as pd
 import pyparsing as pp
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock, local, current_thread
 
-from validol.model.utils.utils import merge_dfs, FillSeries
+from validol.model.utils.utils import align_dfs, FillSeries
+from validol.model.utils.curves import Curves
 from validol.model.store.structures.structure import PieceNameError
 from validol.model.resource_manager.data import Data
+from validol.model.resource_manager.eval_cache import EvalCache, EVAL_CACHE, MISS
 
 
 class AtomWrap:
@@ -21,6 +27,18 @@ STRING = pp.Word(pp.alphas + '%_' + pp.nums)
 
 
 class FormulaGrammar:
+    opn = {"+": operator.add,
+           "-": operator.sub,
+           "*": operator.mul,
+           "/": operator.truediv,
+           "^": operator.pow}
+    fn = {"sin": np.sin,
+          "cos": np.cos,
+          "tan": np.tan,
+          "exp": np.exp,
+          "abs": np.abs,
+          "round": np.round}
+
     def push_first(self, toks):
         self.expr_stack.append(toks[0])
 
@@ -78,17 +96,32 @@ class FormulaGrammar:
 
         self.bnf = expr
 
-        self.opn = {"+": operator.add,
-                    "-": operator.sub,
-                    "*": operator.mul,
-                    "/": operator.truediv,
-                    "^": operator.pow}
-        self.fn = {"sin": np.sin,
-                   "cos": np.cos,
-                   "tan": np.tan,
-                   "exp": np.exp,
-                   "abs": np.abs,
-                   "round": np.round}
+    def compile(self, formula):
+        """
+        Returns the postfix plan of the formula, executed by popping from its end
+        """
+        self.expr_stack = []
+        self.bnf.parseString(formula, True)
+
+        return tuple(self.expr_stack)
+
+
+COMPILE_LOCK = Lock()
+
+
+@lru_cache(maxsize=8)
+def formula_grammar(atom_names):
+    return FormulaGrammar(atom_names)
+
+
+@lru_cache(maxsize=4096)
+def compile_formula(formula, atom_names):
+    """
+    Plans are cached by formula text and atom set (a frozenset of names), so a formula
+    is parsed once per atom set and the grammar is built once per atom set
+    """
+    with COMPILE_LOCK:
+        return formula_grammar(atom_names).compile(formula)
 
 
 class AtomGrammar:
@@ -114,12 +147,10 @@ class AtomGrammar:
         return result
 
 
-class NumericStringParser(FormulaGrammar):
+class NumericStringParser:
     def __init__(self, evaluator):
-        FormulaGrammar.__init__(self, evaluator.atoms_map.keys())
-
         self.evaluator = evaluator
-        self.cache = {}
+        self.atom_names = frozenset(evaluator.atoms_map.keys())
 
     def evaluate_stack(self, stack, params_map):
         op = stack.pop()
@@ -131,15 +162,12 @@ class NumericStringParser(FormulaGrammar):
             args_num = stack.pop()
             params = list(reversed([self.evaluate_stack(stack, params_map) for _ in range(args_num)]))
 
-            name = atom.cache_name(params)
+            key = EvalCache.key(atom, params, self.evaluator)
 
-            if name not in self.cache:
+            if key is None:
                 result = atom.evaluate(self.evaluator, params)
-
-                if name is not None:
-                    self.cache[name] = result
             else:
-                result = self.cache[name]
+                result = self.evaluator.shared(key, lambda: atom.evaluate(self.evaluator, params))
 
             if atom.note() is not None:
                 return result, atom.note()
@@ -156,45 +184,142 @@ class NumericStringParser(FormulaGrammar):
                 if isinstance(operand, FillSeries):
                     operands[i] = operand.adjust(operands[1 - i])
 
-            return self.opn[op](*reversed(operands))
-        elif op in self.fn:
+            return FormulaGrammar.opn[op](*reversed(operands))
+        elif op in FormulaGrammar.fn:
             args_num = stack.pop()
 
-            return self.fn[op](self.evaluate_stack(stack, params_map))
+            return FormulaGrammar.fn[op](self.evaluate_stack(stack, params_map))
         else:
             return op
 
     def evaluate(self, formula, params_map=None):
-        self.bnf.parseString(formula, True)
-
-        return self.evaluate_stack(self.expr_stack, params_map)
+        return self.evaluate_stack(list(compile_formula(formula, self.atom_names)), params_map)
 
 
 class Evaluator:
-    def __init__(self, model_launcher, df, letter_map, range):
-        self.model_launcher = model_launcher
+    """
+    Formulas are evaluated concurrently in a thread pool. Atoms are the nodes shared
+    between them: an atom call with the same key is computed by one thread while
+    the others wait for it, and the result goes to the shared cache.
+    Pool threads get their own range and their own database connections.
+    """
+    WORKERS = 4
+
+    def __init__(self, model_launcher, df, letter_map, range, task=None):
+        self.base_launcher = model_launcher
+        self.task = task
+        self.owner = current_thread()
+        self.local = local()
         self.df = df
         self.letter_map = letter_map
-        self.atoms_map = {atom.name: atom for atom in self.model_launcher.get_atoms()}
+        self.identity = tuple(sorted((letter, str(ai)) for letter, ai in letter_map.items()))
+        self.atoms_map = {atom.name: atom for atom in model_launcher.get_atoms()}
         self.parser = NumericStringParser(self)
-        self.range = range
+        self.base_range = range
+        self.pending = {}
+        self.lock = Lock()
+        self.launchers = []
+
+    @property
+    def model_launcher(self):
+        if current_thread() is self.owner:
+            return self.base_launcher
+
+        if not hasattr(self.local, 'model_launcher'):
+            self.local.model_launcher = self.base_launcher.connect_thread()
+
+            with self.lock:
+                self.launchers.append(self.local.model_launcher)
+
+        return self.local.model_launcher
+
+    @property
+    def range(self):
+        return getattr(self.local, 'range', self.base_range)
+
+    @range.setter
+    def range(self, value):
+        self.local.range = value
+
+    def shared(self, key, compute):
+        result = EVAL_CACHE.get(key)
+        if result is not MISS:
+            return result
+
+        with self.lock:
+            future = self.pending.get(key)
+            computing = future is None
+
+            if computing:
+                future = self.pending[key] = Future()
+
+        if not computing:
+            return future.result()
+
+        try:
+            result = compute()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            EVAL_CACHE.put(key, result)
+        finally:
+            with self.lock:
+                del self.pending[key]
+
+        return result
+
+    def evaluate_one(self, formula):
+        if self.task is not None:
+            self.task.check()
+
+        result = self.parser.evaluate(formula)
+
+        if self.task is not None:
+            self.task.step()
+
+        return result
+
+    def evaluate_all(self, formulas):
+        formulas = list(OrderedDict.fromkeys(formulas))
+
+        if self.task is not None:
+            self.task.set_total(len(formulas))
+
+        try:
+            with ThreadPoolExecutor(Evaluator.WORKERS) as executor:
+                return list(zip(formulas, executor.map(self.evaluate_one, formulas)))
+        finally:
+            for launcher in self.launchers:
+                launcher.close_thread()
+
+            self.launchers = []
 
     def evaluate(self, formulas):
-        df = pd.DataFrame()
+        frames = []
+        scalars = {}
         info = {}
 
-        for formula in formulas:
-            result = self.parser.evaluate(formula)
-
+        for formula, result in self.evaluate_all(formulas):
             if isinstance(result, tuple):
                 info[formula] = result[1]
                 result = result[0]
 
+            if isinstance(result, Curves):
+                result = result.to_series()
+
             if isinstance(result, pd.Series):
-                df = merge_dfs(df, result.to_frame(formula))
+                frames.append(result.to_frame(formula))
             else:
-                df[formula] = result
+                scalars[formula] = result
+
+        df = align_dfs(frames)
+
+        for formula, value in scalars.items():
+            df[formula] = value
 
+        df = df[list(OrderedDict.fromkeys(formulas))]
         df.dropna(axis=0, how='all', inplace=True)
 
         return Data(df, info)
\ No newline at end of file
@@ -1,15 +1,14 @@
 from pyparsing import alphas
 import datetime as dt
-import pandas as pd
 
 from validol.model.resource_manager import evaluator
-from validol.model.store.miners.prices import InvestingPrice
+from validol.model.store.miners.prices import InvestingPrice, InvestingPriceService
 from validol.model.store.resource import Resource
 from validol.model.resource_manager.atom_flavors import MonetaryAtom, MBDeltaAtom, \
     LazyAtom, FormulaAtom, AtomBase, Apply, Merge, Curr, \
     MlCurve, ArgMin, Quantile, Min, Expirations, FillAtom
 from validol.model.store.miners.report_flavors import REPORT_FLAVORS
-from validol.model.utils.utils import merge_dfs
+from validol.model.utils.utils import align_dfs
 
 
 class ResourceManager:
@@ -21,7 +20,7 @@ class ResourceManager:
         return df.rename(columns={name: str(AtomBase(name, [letter])) for name in df.columns})
 
     def prepare_actives(self, actives_info, pure_actives=False):
-        df = pd.DataFrame()
+        dfs = []
 
         for letter, ai in zip(alphas, actives_info):
             active_df = ai.flavor.get_df(ai, self.model_launcher)
@@ -29,7 +28,9 @@ class ResourceManager:
             if not pure_actives:
                 active_df = ResourceManager.add_letter(active_df, letter)
 
-            df = merge_dfs(df, active_df)
+            dfs.append(active_df)
+
+        df = align_dfs(dfs)
 
         begin, end = dt.date(2000, 1, 1), dt.date.today()
 
@@ -38,24 +39,29 @@ class ResourceManager:
             begin, end = min(begin, l), max(end, r)
 
         if not pure_actives:
-            for letter, ai in zip(alphas, actives_info):
-                pair_id = self.model_launcher.get_prices_info(ai.price_url).get('pair_id', None)
+            urls = set(ai.price_url for ai in actives_info)
+            pair_ids = {url: self.model_launcher.get_prices_info(url).get('pair_id', None) for url in urls}
 
-                if pair_id is not None:
-                    prices = InvestingPrice(self.model_launcher, pair_id)
+            prices = InvestingPriceService(self.model_launcher).read(
+                {pair_id: (begin, end) for pair_id in pair_ids.values() if pair_id is not None})
 
-                    prices_df = prices.read_dates(begin, end)
+            dfs = [df] + [ResourceManager.add_letter(prices[pair_ids[ai.price_url]], letter)
+                          for letter, ai in zip(alphas, actives_info)
+                          if pair_ids[ai.price_url] is not None]
 
-                    df = merge_dfs(df, ResourceManager.add_letter(prices_df, letter))
+            df = align_dfs(dfs)
 
         return df, (begin, end)
 
-    def prepare_tables(self, table_pattern, actives_info):
+    def prepare_tables(self, table_pattern, actives_info, task=None):
         letter_map = dict(zip(alphas, actives_info))
 
         df, range = self.prepare_actives(actives_info)
 
-        evaluator_ = evaluator.Evaluator(self.model_launcher, df, letter_map, range)
+        if task is not None:
+            task.check()
+
+        evaluator_ = evaluator.Evaluator(self.model_launcher, df, letter_map, range, task)
 
         return evaluator_.evaluate(table_pattern.all_formulas())
 
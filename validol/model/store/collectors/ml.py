@@ -1,6 +1,8 @@
+import numpy as np
 import pandas as pd
 
-from validol.model.utils.utils import to_timestamp, group_by
+from validol.model.utils.utils import to_timestamp, segment_cumsum, segment_rcumsum
+from validol.model.utils.curves import Curves
 from validol.model.store.resource import ActiveResource, FlavorUpdater, check_empty
 from validol.model.store.miners.daily_reports.flavors import DAILY_REPORT_FLAVORS
 from validol.model.store.utils import reduce_ranges, range_from_timestamp
@@ -8,13 +10,13 @@ from validol.model.store.utils import reduce_ranges, range_from_timestamp
 
 @check_empty
 def pre_dump(df):
-    df.CURVE = df.CURVE.apply(lambda series: series.to_json(orient='split'))
+    df.CURVE = df.CURVE.apply(Curves.pack)
 
     return df
 
 @check_empty
 def post_load(df):
-    df.CURVE = df.CURVE.map(lambda json: pd.read_json(json, typ='series', orient='split'))
+    df.CURVE = Curves.from_blobs(df.index, df.CURVE.values).to_series()
 
     return df
 
@@ -43,7 +45,7 @@ class MlCurves(FlavorUpdater):
 class MlCurve(ActiveResource):
     SCHEMA = [
         ('CONTRACT', 'TEXT'),
-        ('CURVE', 'TEXT')
+        ('CURVE', 'BLOB')
     ]
 
     @staticmethod
@@ -68,32 +70,50 @@ class MlCurve(ActiveResource):
 
     @staticmethod
     def ml(df):
-        df = df.set_index('STRIKE', drop=False).sort_index()
+        """
+        Curves of all (Date, CONTRACT) groups of df at once. For every strike the curve is
+        the total payout of calls below and puts above it, computed with segment sums
+        over the frame sorted by (Date, CONTRACT, STRIKE).
+        """
+        if df.empty:
+            return pd.DataFrame(columns=['Date', 'CONTRACT', 'CURVE'])
 
-        result = pd.Series()
-        for letter, direction in (('C', 1), ('P', -1)):
-            line = df.iloc[::direction]
-            line = (abs(line.STRIKE.diff().fillna(0)) *
-                    (line.OI * (line.PC == letter)).cumsum().shift(1).fillna(0)).cumsum()
+        oi = df.OI.fillna(0)
+        levels = df.assign(CALL=oi * (df.PC == 'C'), PUT=oi * (df.PC == 'P')) \
+            .groupby(['Date', 'CONTRACT', 'STRIKE'])[['CALL', 'PUT']].sum().reset_index()
 
-            result = result.add(line, fill_value=0)
+        date, contract = levels.Date.values, levels.CONTRACT.values
+        strike = levels.STRIKE.values.astype(np.float64)
 
-        return result.drop_duplicates()
+        new_group = np.r_[True, (date[1:] != date[:-1]) | (contract[1:] != contract[:-1])]
+        starts = np.flatnonzero(new_group)
 
-    def process_dates(self, mapping):
-        df = self.ai.flavor.get_full_df(self.ai, self.model_launcher)
+        step = np.r_[0, np.diff(strike)]
+        step[starts] = 0
 
-        if not df.empty:
-            info = group_by(mapping(df).reset_index(), ['Date', 'CONTRACT'])
+        calls_below = np.r_[0, segment_cumsum(levels.CALL.values, starts)[:-1]]
+        puts_above = np.r_[segment_rcumsum(levels.PUT.values, starts)[1:], 0]
+
+        levels['VALUE'] = segment_cumsum(step * calls_below, starts) + \
+            segment_rcumsum(np.r_[step[1:], 0] * puts_above, starts)
+
+        levels = levels.drop_duplicates(['Date', 'CONTRACT', 'VALUE'])
+
+        keys = levels[['Date', 'CONTRACT']].drop_duplicates()
+        bounds = np.flatnonzero(levels.index.isin(keys.index))[1:]
 
-            result = pd.DataFrame()
+        curves = [pd.Series(values, index=strikes)
+                  for values, strikes in zip(np.split(levels.VALUE.values, bounds),
+                                             np.split(levels.STRIKE.values, bounds))]
 
-            for date, contract in info.groups.keys():
-                result = result.append(pd.DataFrame(
-                    [[date, contract, MlCurve.ml(info.get_group((date, contract)))]],
-                    columns=['Date', 'CONTRACT', 'CURVE']))
+        return pd.DataFrame({'Date': keys.Date.values, 'CONTRACT': keys.CONTRACT.values, 'CURVE': curves},
+                            columns=['Date', 'CONTRACT', 'CURVE'])
 
-            return result
+    def process_dates(self, mapping):
+        df = self.ai.flavor.get_full_df(self.ai, self.model_launcher)
+
+        if not df.empty:
+            return MlCurve.ml(mapping(df).reset_index())
         else:
             return df
 
@@ -106,7 +126,13 @@ class MlCurve(ActiveResource):
 
     def read_curves(self, with_flavor):
         if with_flavor:
-            return self.read_df('SELECT Date, CURVE FROM "{table}" WHERE CONTRACT = ?', params=(self.ai.active_flavor,)).CURVE
+            rows = self.dbh.cursor().execute(
+                'SELECT Date, CURVE FROM "{table}" WHERE CONTRACT = ? ORDER BY Date'.format(table=self.table),
+                (self.ai.active_flavor,)).fetchall()
+
+            dates, blobs = zip(*rows) if rows else ((), ())
+
+            return Curves.from_blobs(pd.Index(dates, name='Date'), blobs)
         else:
             return self.read_df()
 
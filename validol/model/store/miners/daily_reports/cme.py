@@ -1,41 +1,178 @@
 import datetime as dt
-from ftplib import FTP
 import os
 from zipfile import ZipFile
-from io import BytesIO
+from contextlib import contextmanager
 from functools import lru_cache
 import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
 from validol.model.store.resource import Actives, Platforms
 from validol.model.store.view.active_info import ActiveInfo
-from validol.model.store.miners.daily_reports.daily import DailyResource, NetCache
-from validol.model.utils.utils import isfile
+from validol.model.store.miners.daily_reports.daily import DailyResource, NetCache, parse_mapped_date
+from validol.model.store.miners.daily_reports.pdf_helpers.cme import CmeParser, section_runs
+from validol.model.utils.utils import concat
 from validol.model.store.structures.ftp_cache import FtpCache
+from validol.model.mine.ftp import ftp_pool
 from validol.model.store.utils import reduce_ranges
+from validol.model.utils.pdf_index import PdfIndex
 
 
 class CmeDaily:
+    """
+    All CME actives are read from the same daily bulletin, so the update goes date by
+    date for futures and options flavors alike: every bulletin is loaded and extracted
+    once and its sections are handed to the parsers of all actives that miss this date.
+    The ranges of the other flavors are left in shared, so their updaters return them
+    without another pass while no newer bulletin has appeared.
+    """
+    shared = {}
+
     def __init__(self, model_launcher, flavor):
         self.model_launcher = model_launcher
         self.flavor = flavor
 
-    def update(self):
-        platforms_table = Platforms(self.model_launcher, self.flavor['name'])
-        platforms_table.write_single('CME', 'CHICAGO MERCANTILE EXCHANGE')
-
+    def get_actives(self, adc):
+        """
+        Returns (flavor name, active) for the actives of all CME daily flavors
+        """
         from validol.model.store.miners.daily_reports.cme_view import CmeView
+        from validol.model.store.miners.daily_reports.cme_flavors import CME_DAILY_FLAVORS
+
+        actives = []
+
+        for flavor in CME_DAILY_FLAVORS:
+            platforms_table = Platforms(self.model_launcher, flavor['name'])
+            platforms_table.write_single('CME', 'CHICAGO MERCANTILE EXCHANGE')
+
+            for index, active in CmeActives(self.model_launcher, flavor['name']).read_df().iterrows():
+                pdf_helper = self.model_launcher.read_pdf_helper(
+                    ActiveInfo(CmeView(flavor), active.PlatformCode, active.ActiveName))
+
+                actives.append((flavor['name'], Active(self.model_launcher, active.PlatformCode,
+                                                       active.ActiveName, flavor, pdf_helper, adc)))
+
+        return actives
+
+    @staticmethod
+    def read_sections(date, actives):
+        """
+        Yields (active, archive file, section pdf, bulletin index) for the actives.
+        Bulletins are shared by all actives with the same local folder, so each one
+        is read and unzipped once.
+        """
+        groups = defaultdict(list)
+        for active in actives:
+            groups[active.pdf_helper.active_folder].append(active)
+
+        for group in groups.values():
+            with group[0].cache.open(date) as content:
+                if content is None:
+                    continue
+
+                index = group[0].index(date)
+                sections = CmeParser.read_sections(
+                    content, [active.pdf_helper.other_info['archive_file'] for active in group], index)
+
+            if sections is None:
+                group[0].cache.delete(date)
+                continue
+
+            for active in group:
+                archive_file = active.pdf_helper.other_info['archive_file']
+
+                yield active, archive_file, sections[archive_file], index
+
+    @staticmethod
+    def locate(executor, items):
+        """
+        Fills the indices with the page runs of all actives in their sections,
+        every section missing some of them is read once in the pool
+        """
+        missing = {}
+
+        for date, active, archive_file, section, index in items:
+            name = active.pdf_helper.name.active
+
+            if name not in index.runs(archive_file):
+                missing.setdefault((date, archive_file), (section, index, set()))[2].add(name)
+
+        futures = [(archive_file, index, executor.submit(section_runs, section, sorted(names)))
+                   for (_, archive_file), (section, index, names) in missing.items()]
+
+        for archive_file, index, future in futures:
+            index.add_runs(archive_file, future.result())
+
+    def download_dates(self, date_actives):
+        dates = sorted(date_actives)
+        batch = DailyResource.PARSE_WORKERS * 2
+        dfs = defaultdict(list)
+
+        if not dates:
+            return dfs
+
+        with ProcessPoolExecutor(DailyResource.PARSE_WORKERS) as executor:
+            for i in range(0, len(dates), batch):
+                Active.Cache.prefetch(self.model_launcher, {
+                    active.active_cache.file(date) for date in dates[i:i + batch]
+                    for active in date_actives[date]
+                    if not active.cache.fs_cache.available()} - {None})
+
+                items = [(date,) + item
+                         for date in dates[i:i + batch]
+                         for item in CmeDaily.read_sections(date, date_actives[date])]
+
+                CmeDaily.locate(executor, items)
+
+                jobs = [(date, active, executor.submit(parse_mapped_date, active.pdf_helper, date, section,
+                                                       index.runs(archive_file).get(active.pdf_helper.name.active)))
+                        for date, active, archive_file, section, index in items]
+
+                for date, active, future in jobs:
+                    _, df = future.result()
+
+                    if df is None:
+                        active.cache.delete(date)
+                    else:
+                        dfs[active].append(df)
 
-        ranges = []
+        return dfs
+
+    def update(self):
         adc = Active.Cache.make_available_dates_cache()
+        latest = max(adc) if adc else None
+
+        shared = CmeDaily.shared.pop(self.flavor['name'], None)
+        if shared is not None and shared[0] == latest:
+            return shared[1]
+
+        flavors = {}
+        initial = {}
+        date_actives = defaultdict(list)
+
+        for flavor, active in self.get_actives(adc):
+            flavors[active] = flavor
+            missing = active.missing_dates()
+
+            if missing is not None:
+                initial[active], dates = missing
 
-        for index, active in CmeActives(self.model_launcher, self.flavor['name']).read_df().iterrows():
-            pdf_helper = self.model_launcher.read_pdf_helper(
-                ActiveInfo(CmeView(self.flavor), active.PlatformCode, active.ActiveName))
+                for date in dates:
+                    date_actives[date].append(active)
 
-            ranges.append(Active(self.model_launcher, active.PlatformCode, active.ActiveName,
-                                 self.flavor, pdf_helper, adc).update())
+        dfs = self.download_dates(date_actives)
 
-        return reduce_ranges(ranges)
+        ranges = defaultdict(list)
+
+        for active, df in initial.items():
+            info = df.append(concat(dfs[active]))
+            active.write_update(info)
+            ranges[flavors[active]].append(active.get_range(info))
+
+        for flavor in set(flavors.values()) - {self.flavor['name']}:
+            CmeDaily.shared[flavor] = latest, reduce_ranges(ranges[flavor])
+
+        return reduce_ranges(ranges[self.flavor['name']])
 
 
 class Active(DailyResource):
@@ -46,6 +183,15 @@ class Active(DailyResource):
         DailyResource.__init__(self, model_launcher, platform_code, active_name, CmeActives,
                                flavor, pdf_helper, Active.Cache(self, adc))
 
+    def index(self, date):
+        """
+        Page index of the bulletin of the date, persistent only for bulletins of the FtpCache
+        """
+        if self.cache.fs_cache.available():
+            return PdfIndex()
+
+        return self.active_cache.index(date)
+
     class Cache(NetCache):
         def __init__(self, cme_active, adc=None):
             self.cme_active = cme_active
@@ -84,21 +230,24 @@ class Active(DailyResource):
         @staticmethod
         def get_files():
             try:
-                with FTP(Active.FTP_SERVER) as ftp:
-                    ftp.login()
-                    ftp.cwd(Active.FTP_DIR)
-                    files = [file for file in ftp.nlst() if isfile(ftp, file)]
-
-                return files
+                return list(ftp_pool(Active.FTP_SERVER).listing(Active.FTP_DIR))
             except Exception as e:
                 print(e)
 
                 return []
 
+        @staticmethod
+        def prefetch(model_launcher, filenames):
+            FtpCache(model_launcher).prefetch(Active.FTP_SERVER, list(map(Active.Cache.ftp_path, filenames)))
+
+        @staticmethod
+        def ftp_path(filename):
+            return os.path.join(Active.FTP_DIR, filename)
+
         @staticmethod
         def read_file(model_launcher, filename, with_cache=True):
             return FtpCache(model_launcher) \
-                .get(Active.FTP_SERVER, os.path.join(Active.FTP_DIR, filename), with_cache)
+                .get(Active.FTP_SERVER, Active.Cache.ftp_path(filename), with_cache)
 
         def file(self, handle):
             return self.available_dates_cache.get(handle, None)
@@ -115,24 +264,51 @@ class Active(DailyResource):
 
                 return None, None
 
+        @contextmanager
+        def open(self, handle):
+            filename = self.file(handle)
+            ftp_cache = FtpCache(self.cme_active.model_launcher)
+            entry = None
+
+            if filename is not None:
+                try:
+                    entry = ftp_cache.entry(Active.FTP_SERVER, Active.Cache.ftp_path(filename))
+                except Exception as e:
+                    print(e)
+
+            if entry is None:
+                yield None
+            else:
+                with ftp_cache.open_entry(entry) as content:
+                    yield content
+
+        def index(self, handle):
+            filename = self.file(handle)
+            ftp_cache = FtpCache(self.cme_active.model_launcher)
+            entry = None if filename is None else ftp_cache.lookup(Active.Cache.ftp_path(filename))
+
+            return PdfIndex(None if entry is None else ftp_cache.index_path(entry.digest))
+
         def available_handles(self):
             return self.available_dates_cache.keys()
 
         def delete(self, date):
             file = self.available_dates_cache.get(date, None)
             if file is not None:
-                FtpCache(self.cme_active.model_launcher).remove_by_name(file)
+                FtpCache(self.cme_active.model_launcher).remove_by_name(Active.Cache.ftp_path(file))
 
     @staticmethod
     def get_archive_files(model_launcher):
-        item = FtpCache(model_launcher).one_or_none()
-        if item is None:
-            file = Active.Cache.get_files()[0]
-            item = Active.Cache.read_file(model_launcher, file)
-        else:
-            item = item.value
-
-        with ZipFile(BytesIO(item), 'r') as zip_file:
+        ftp_cache = FtpCache(model_launcher)
+
+        with ftp_cache.open_any() as content:
+            if content is not None:
+                with ZipFile(content, 'r') as zip_file:
+                    return zip_file.namelist()
+
+        file = Active.Cache.ftp_path(Active.Cache.get_files()[0])
+
+        with ftp_cache.open(Active.FTP_SERVER, file) as content, ZipFile(content, 'r') as zip_file:
             return zip_file.namelist()
 
 
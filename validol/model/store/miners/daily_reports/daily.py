@@ -1,4 +1,9 @@
+import datetime as dt
+import os
 import pandas as pd
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 from validol.model.utils.utils import concat
 from validol.model.store.resource import ActiveResource
@@ -17,6 +22,12 @@ class NetCache:
     def file(self, handle):
         return handle
 
+    @contextmanager
+    def open(self, handle):
+        filename, content = self.get(handle, True)
+
+        yield content
+
     def one(self):
         raise NotImplementedError
 
@@ -56,6 +67,18 @@ class Cache:
 
             return content
 
+    @contextmanager
+    def open(self, handle):
+        """
+        Yields the content as bytes or, when it comes straight from the network cache,
+        as a seekable buffer that is valid only inside the block
+        """
+        if self.fs_cache.available():
+            yield self.get(handle)
+        else:
+            with self.net_cache.open(handle) as content:
+                yield content
+
     def delete(self, handle):
         if self.fs_cache.available():
             filename = self.file(handle)
@@ -88,6 +111,9 @@ class Cache:
 
 
 class DailyResource(ActiveResource):
+    PARSE_WORKERS = os.cpu_count() or 1
+    INLINE_DATES = 2
+
     def __init__(self, model_launcher, platform_code, active_name, actives_cls, flavor,
                  pdf_helper, active_cache):
         ActiveResource.__init__(self,
@@ -116,20 +142,70 @@ class DailyResource(ActiveResource):
         return self.read_df('SELECT * FROM "{table}" WHERE CONTRACT = ?', params=(contract,))
 
     def download_dates(self, dates):
-        return concat([self.download_date(date) for date in dates])
+        """
+        A few dates, as in a daily update, are parsed in this process,
+        the process pool is started for backfills only
+        """
+        dates = sorted(dates)
 
-    def initial_fill(self):
+        if len(dates) <= DailyResource.INLINE_DATES:
+            return self.parse_dates(map, dates)
+
+        with ProcessPoolExecutor(DailyResource.PARSE_WORKERS) as executor:
+            return self.parse_dates(executor.map, dates)
+
+    def parse_dates(self, map_func, dates):
+        batch = DailyResource.PARSE_WORKERS * 2
+        dfs = []
+
+        for i in range(0, len(dates), batch):
+            jobs = [(date, self.cache.get(date)) for date in dates[i:i + batch]]
+            jobs = [(date, content) for date, content in jobs if content is not None]
+
+            results = map_func(parse_date, repeat(self.pdf_helper),
+                               [date for date, _ in jobs],
+                               [content for _, content in jobs])
+
+            for date, df in results:
+                if df is None:
+                    self.cache.delete(date)
+                else:
+                    dfs.append(df)
+
+        return concat(dfs)
+
+    def initial_dates(self):
         df = self.pdf_helper.initial(self.model_launcher)
 
         if not df.empty:
-            net_df = self.download_dates(set(self.available_dates()) - set(df.Date))
+            return df, set(self.available_dates()) - set(df.Date)
         else:
-            net_df = self.download_dates(self.available_dates())
+            return df, set(self.available_dates())
+
+    def fill_dates(self):
+        return set(self.available_dates()) - set(date_from_timestamp(self.read_df()).index)
+
+    def missing_dates(self):
+        """
+        Returns locally available data and dates to be downloaded,
+        None if the resource is up to date
+        """
+        first, last = self.range()
+
+        if first is None:
+            return self.initial_dates()
+        elif last != dt.date.today():
+            return pd.DataFrame(), self.fill_dates()
+        else:
+            return None
+
+    def initial_fill(self):
+        df, dates = self.initial_dates()
 
-        return df.append(net_df)
+        return df.append(self.download_dates(dates))
 
     def fill(self, first, last):
-        return self.download_dates(set(self.available_dates()) - set(date_from_timestamp(self.read_df()).index))
+        return self.download_dates(self.fill_dates())
 
     def available_dates(self):
         fs_cache = FsCache(self.pdf_helper.active_folder)
@@ -137,13 +213,16 @@ class DailyResource(ActiveResource):
 
         return self.cache.available_handles()
 
-    def download_date(self, date):
-        content = self.cache.get(date)
 
-        if content is not None:
-            try:
-                return self.pdf_helper.parse_content(content, date)
-            except ValueError:
-                self.cache.delete(date)
+def parse_date(pdf_helper, date, content):
+    try:
+        return date, pdf_helper.parse_content(content, date)
+    except ValueError:
+        return date, None
+
 
-        return pd.DataFrame()
\ No newline at end of file
+def parse_mapped_date(pdf_helper, date, content, pages=None):
+    try:
+        return date, pdf_helper.parse_mapped_content(content, date, pages)
+    except ValueError:
+        return date, None
\ No newline at end of file
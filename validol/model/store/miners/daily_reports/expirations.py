@@ -1,13 +1,16 @@
 import datetime as dt
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
 from requests_cache import enabled
+import numpy as np
 import pandas as pd
 import re
 from io import StringIO
 import requests
 from dateutil.relativedelta import relativedelta
 
-from validol.model.store.resource import ResourceUpdater
-from validol.model.utils.utils import concat, date_from_timestamp, to_timestamp, merge_dfs
+from validol.model.store.resource import ResourceUpdater, Ranges
+from validol.model.utils.utils import concat, date_from_timestamp, date_to_timestamp, to_timestamp, merge_dfs
 
 
 class Expirations(ResourceUpdater):
@@ -22,6 +25,12 @@ class Expirations(ResourceUpdater):
     CONSTRAINT = 'UNIQUE (Date, Contract, PlatformCode, Event, ActiveCode, ActiveName) ON CONFLICT IGNORE'
     PLATFORM_RENAME = {'EUROPE': 'IFEU'}
     NET = 'net'
+    SUMMARY = '(?P<PlatformCode>.*?): (?P<Event>.*?):.*'
+    DESCRIPTION = r'^[^\S\n]*(?P<Contract>.*): (?P<ActiveName>.*) \[(?P<ActiveCode>.*)\]$'
+    URL = 'https://www.theice.com/marketdata/ExpiryCalendar.shtml'
+
+    schedules = {}
+    schedules_lock = Lock()
 
     def __init__(self, model_launcher):
         ResourceUpdater.__init__(self, model_launcher, model_launcher.main_dbh, 'Expirations',
@@ -50,101 +59,152 @@ class Expirations(ResourceUpdater):
 
         return df.set_index('Date').sort_index().Contract
 
-    def current(self, ai, delta, df):
-        df['CONTRACT'] = df['CONTRACT'].apply(Expirations.from_contract)
+    @staticmethod
+    def month_index(date):
+        return date.year * 12 + date.month - 1
+
+    def schedule(self, ai, delta):
+        """
+        Returns (bounds, contracts): a row dated t lies in the roll window i with
+        bounds[i - 1] < t <= bounds[i], its current contract is the month index contracts[i].
+        Cached per (active, delta) until the Expirations table changes.
+        """
+        exp = self.model_launcher.get_exp_info(ai)
+        days = ai.flavor.config().get('expirations_delta', 0)
 
-        exp_info = date_from_timestamp(self.exp_info(ai)).apply(Expirations.from_contract)
+        key = exp['PlatformCode'], exp['ActiveName'], exp['ActiveCode'], ai.active_only(), delta, days
+        version = Ranges.table_version(self.table)
 
-        result = pd.DataFrame()
+        with Expirations.schedules_lock:
+            cached = Expirations.schedules.get(key)
 
-        date_delta = relativedelta(days=ai.flavor.config().get('expirations_delta', 0))
+        if cached is not None and cached[0] == version:
+            return cached[1]
 
-        for i in range(1, len(exp_info)):
-            begin, end = map(lambda index: to_timestamp(exp_info.index[index] + date_delta), [i - 1, i])
+        exp_info = date_from_timestamp(self.exp_info(ai))
+        date_delta = relativedelta(days=days)
 
-            curr_contract = exp_info.iloc[i] + relativedelta(months=delta)
+        bounds = np.array([to_timestamp(date + date_delta) for date in exp_info.index], dtype=np.int64)
+        contracts = np.array([Expirations.month_index(Expirations.from_contract(contract)) + delta
+                              for contract in exp_info.values], dtype=np.int64)
 
-            result = result.append(df[
-                (begin < df.index) &
-                (df.index <= end) &
-                (df.CONTRACT == curr_contract)])
+        with Expirations.schedules_lock:
+            Expirations.schedules[key] = version, (bounds, contracts)
 
-        return result
+        return bounds, contracts
 
-    def parse_csv(self, csv):
-        df = pd.read_csv(StringIO(csv),
-                         header=3,
-                         parse_dates=['Date'],
-                         date_parser=lambda date: dt.datetime.strptime(date, '%d-%b-%Y').date())
+    def current(self, ai, delta, df):
+        bounds, contracts = self.schedule(ai, delta)
 
-        summary = re.compile('(.*?): (.*?):.*')
-        description = re.compile('^\s*(.*): (.*) \[(.*)\]$')
-        result = pd.DataFrame()
+        codes = df.CONTRACT.unique()
+        df['CONTRACT'] = df.CONTRACT.map(pd.Series([Expirations.from_contract(code) for code in codes],
+                                                   index=codes))
 
-        for i, row in df.iterrows():
-            lines = row.Description.split('\n')[1:-1]
-            data = []
-            for line in lines:
-                match = description.match(line)
-                data.append([match.group(i) for i in range(1, 4)])
+        if len(bounds) < 2:
+            return df.iloc[:0]
 
-            new_df = pd.DataFrame(data, columns=['Contract', 'ActiveName', 'ActiveCode'])
+        window = np.searchsorted(bounds, df.index.values, side='left')
+        months = df.CONTRACT.map(Expirations.month_index).values
 
-            new_df['Date'] = row['Date']
+        mask = (window > 0) & (window < len(bounds)) & \
+            (months == contracts[np.clip(window, 0, len(bounds) - 1)])
 
-            match = summary.match(row.Summary)
-            new_df['PlatformCode'] = Expirations.PLATFORM_RENAME.get(match.group(1), match.group(1))
-            new_df['Event'] = match.group(2)
+        return df[mask]
 
-            result = result.append(new_df, ignore_index=True)
+    @staticmethod
+    def parse_csv(csv):
+        """
+        Every row describes one event for several contracts, one per description line
+        except the first and the last. All lines are extracted in one pass.
+        """
+        df = pd.read_csv(StringIO(csv), header=3)
+
+        if df.empty:
+            return pd.DataFrame()
+
+        rows = df.Summary.str.extract(Expirations.SUMMARY, expand=True)
+        rows['PlatformCode'] = rows.PlatformCode.replace(Expirations.PLATFORM_RENAME)
+        rows['Date'] = pd.to_datetime(df.Date, format='%d-%b-%Y').dt.date
 
+        lines = df.Description.str.split('\n').str[1:-1].str.join('\n')\
+            .str.extractall(Expirations.DESCRIPTION, flags=re.MULTILINE)
+
+        result = lines.reset_index(level='match', drop=True).join(rows).reset_index(drop=True)
         result['Source'] = Expirations.NET
 
         return result
 
+    @staticmethod
+    def fetch(session, first):
+        response = session.get(
+            url=Expirations.URL,
+            params={
+                'excel': '',
+                'markets': (
+                    "ICE Futures U.S.",
+                    "ICE Futures Europe",
+                    "ICE Futures Canada",
+                    "ICE OTC",
+                    "ICE Trust U.S.",
+                    "ICE Clear Europe CDS",
+                    "ICE Endex",
+                    "ICE Futures Singapore"
+                ),
+                'expirationEnabled': "true",
+                'expirationDates': (
+                    "FTD",
+                    "LTD",
+                    "FDD",
+                    "LDD",
+                    "FND",
+                    "LND",
+                    "FSD"
+                ),
+                'dateFrom': first.strftime('%d-%b-%Y')
+            },
+            headers={
+                'User-Agent': 'Mozilla/5.0',
+            }
+        )
+
+        return response.text
+
+    @staticmethod
+    def next_date(csv):
+        return dt.datetime.strptime(csv.splitlines()[2][4:], '%d-%b-%Y').date() + dt.timedelta(days=1)
+
     def fill(self, first, last):
+        """
+        A page tells where the next one starts, so pages are fetched one after another
+        over a kept-alive session while the previous ones are parsed in the background
+        """
         last += relativedelta(years=7)
 
-        dfs = []
+        pages = []
 
-        with enabled():
+        with enabled(), requests.Session() as session, ThreadPoolExecutor(1) as parser:
             while first <= last:
-                response = requests.get(
-                    url='https://www.theice.com/marketdata/ExpiryCalendar.shtml',
-                    params={
-                        'excel': '',
-                        'markets': (
-                            "ICE Futures U.S.",
-                            "ICE Futures Europe",
-                            "ICE Futures Canada",
-                            "ICE OTC",
-                            "ICE Trust U.S.",
-                            "ICE Clear Europe CDS",
-                            "ICE Endex",
-                            "ICE Futures Singapore"
-                        ),
-                        'expirationEnabled': "true",
-                        'expirationDates': (
-                            "FTD",
-                            "LTD",
-                            "FDD",
-                            "LDD",
-                            "FND",
-                            "LND",
-                            "FSD"
-                        ),
-                        'dateFrom': first.strftime('%d-%b-%Y')
-                    },
-                    headers={
-                        'User-Agent': 'Mozilla/5.0',
-                    }
-                )
-
-                first = dt.datetime.strptime(response.text.splitlines()[2][4:], '%d-%b-%Y').date() + dt.timedelta(days=1)
-
-                dfs.append(self.parse_csv(response.text))
-
-        return concat(dfs)
+                csv = Expirations.fetch(session, first)
+                first = Expirations.next_date(csv)
+
+                pages.append(parser.submit(Expirations.parse_csv, csv))
+
+            return concat([page.result() for page in pages])
+
+    def write_df(self, df):
+        """
+        Rows go in with one executemany, the UNIQUE constraint drops the known ones
+        """
+        if not df.empty:
+            if df.Date.dtype != np.int64:
+                df = date_to_timestamp(df)
+
+            values = df.reindex(columns=[name for name, _ in self.schema]).astype(object)
+
+            self.write(values.where(pd.notnull(values), None).values.tolist())
+
+        self.ranges.refresh(self.table)
+        self.dbh.commit()
 
     def initial_fill(self):
         return self.fill(dt.date(2016, 1, 1), dt.date.today())
@@ -157,6 +217,7 @@ class Expirations(ResourceUpdater):
             WHERE
                 Source = ?'''.format(table=self.table), (ai.active_only(),))
 
+        self.ranges.refresh(self.table)
         self.dbh.commit()
 
     def get_expirations(self):
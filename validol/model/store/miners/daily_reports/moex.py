@@ -1,23 +1,33 @@
 import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from requests import Request
+from requests import Request, Session
+from requests.adapters import HTTPAdapter
 from io import StringIO
 from requests_cache import CachedSession
 
 from validol.model.store.resource import Updatable, Platforms
 from validol.model.utils.utils import concat
-from validol.model.store.miners.weekly_reports.utils import active_iterator
-from validol.model.store.utils import reduce_ranges
-from validol.model.mine.utils import remove_from_cache
+from validol.model.store.miners.weekly_reports.utils import flavor_range
 from validol.model.store.miners.weekly_reports.active import WeeklyActives, Active
 
 
 class MoexUpdatable(Updatable):
+    """
+    Days are downloaded concurrently through a pooled session, a batch at a time. The
+    requests cache is read and written from the calling thread only, days without data
+    are not cached. Only weekdays and the transferred working Saturdays are requested.
+    """
+    WORKERS = 8
+    BATCH = 64
+
     def __init__(self, model_launcher, flavor):
         self.model_launcher = model_launcher
         self.session = CachedSession()
+        self.pool = Session()
+        self.pool.mount('https://', HTTPAdapter(pool_maxsize=MoexUpdatable.WORKERS))
 
-    def download_date(self, date):
+    def make_request(self, date):
         request = Request(
             method='GET',
             url='https://www.moex.com/ru/derivatives/open-positions-csv.aspx',
@@ -27,43 +37,68 @@ class MoexUpdatable(Updatable):
             headers={'User-Agent': 'Mozilla/5.0'}
         )
 
-        request = self.session.prepare_request(request)
-        response = self.session.send(request)
+        return self.session.prepare_request(request)
 
-        df = pd.read_csv(StringIO(response.text), parse_dates=['moment'])
+    @staticmethod
+    def parse_date(text):
+        df = pd.read_csv(StringIO(text), parse_dates=['moment'])
 
         if df.empty:
-            remove_from_cache(self.session, request)
-
             return pd.DataFrame()
 
         df = df.rename(columns={'moment': 'Date', 'isin': 'code'})
 
-        df.name = df.apply(lambda row: '{} ({})'.format(row['name'],
-                                                        MOEX['ct_mapping'][row['contract_type']]), axis=1)
-        df.iz_fiz.fillna(0, inplace=True)
+        df['name'] = df.name + ' (' + df.contract_type.map(MOEX['ct_mapping']) + ')'
+        df['iz_fiz'] = df.iz_fiz.fillna(0).map(MOEX['phys_mapping'])
+
+        df = df.pivot_table(index=['Date', 'name'], columns='iz_fiz',
+                            values=list(MOEX['csv_mapping'].keys()), aggfunc='last')
 
-        keys = ('Date', 'name')
+        df.columns = ['{}{}'.format(phys, MOEX['csv_mapping'][key]) for key, phys in df.columns]
 
-        groups = df.groupby(keys)
+        return df.reset_index()
 
-        df = pd.DataFrame([{**{'{}{}'.format(MOEX['phys_mapping'][row['iz_fiz']], value): row[key]
-                               for i, row in content.iterrows()
-                               for key, value in MOEX['csv_mapping'].items()},
-                            **dict(zip(keys, group))} for
-                           group, content in groups])
+    @staticmethod
+    def trading_days(first, last):
+        saturdays = [date for date in MOEX['working_saturdays'] if first <= date <= last]
 
-        return df
+        return pd.bdate_range(first, last).union(pd.DatetimeIndex(saturdays))
 
     def initial_fill(self):
         return self.fill(MOEX['first_date'], dt.date.today())
 
     def fill(self, first, last):
-        return concat([self.download_date(date) for date in pd.date_range(first, last)])
+        cache = self.session.cache
+        days = MoexUpdatable.trading_days(first, last)
+
+        dfs = []
+
+        with ThreadPoolExecutor(MoexUpdatable.WORKERS) as executor:
+            for i in range(0, len(days), MoexUpdatable.BATCH):
+                requests = [self.make_request(date) for date in days[i:i + MoexUpdatable.BATCH]]
+                keys = [cache.create_key(request) for request in requests]
+                cached = [cache.get_response_and_time(key)[0] for key in keys]
+
+                downloads = [executor.submit(self.pool.send, request) if response is None else None
+                             for request, response in zip(requests, cached)]
+
+                for key, response, download in zip(keys, cached, downloads):
+                    if download is not None:
+                        response = download.result()
+
+                    df = MoexUpdatable.parse_date(response.text)
+
+                    if df.empty:
+                        cache.delete(key)
+                    elif download is not None:
+                        cache.save_response(key, response)
+
+                    dfs.append(df)
+
+        return concat(dfs)
 
     def range(self):
-        return reduce_ranges([active.range() for active in
-                              active_iterator(MOEX, self.model_launcher)])
+        return flavor_range(MOEX, self.model_launcher)
 
     def write_update(self, data):
         if not data.empty:
@@ -95,6 +130,19 @@ MOEX = {
         'long_position': 'L'
     },
     'first_date': dt.date(2012, 11, 1),
+    'working_saturdays': [
+        dt.date(2012, 12, 29),
+        dt.date(2016, 2, 20),
+        dt.date(2018, 4, 28),
+        dt.date(2018, 6, 9),
+        dt.date(2018, 12, 29),
+        dt.date(2021, 2, 20),
+        dt.date(2022, 3, 5),
+        dt.date(2024, 4, 27),
+        dt.date(2024, 11, 2),
+        dt.date(2024, 12, 28),
+        dt.date(2025, 11, 1)
+    ],
     'ct_mapping': {
         'F': 'Futures',
         'C': 'Option call',
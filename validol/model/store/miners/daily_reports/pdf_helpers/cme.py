@@ -8,7 +8,22 @@ import random
 import PyPDF2 as ppdf
 
 from validol.model.store.miners.daily_reports.pdf_helpers.utils import filter_rows, DailyPdfParser, is_contract
-from validol.model.utils.utils import get_pages_run
+from validol.model.utils.utils import get_page_texts, pages_run
+from validol.model.utils.pdf_index import PdfIndex
+
+
+def section_runs(content, actives):
+    """
+    Page runs of the actives in a section pdf, its text is extracted once for all of them
+    """
+    try:
+        texts = get_page_texts(BytesIO(content))
+    except Exception as e:
+        print(e)
+
+        return {}
+
+    return {active: pages_run(texts, active) for active in actives}
 
 
 class CmeParser(DailyPdfParser):
@@ -54,20 +69,48 @@ class CmeParser(DailyPdfParser):
 
         return CmeParser.if_preliminary_pdf(BytesIO(zip_file.read(main_file)))
 
+    @staticmethod
+    def open_zip(content):
+        return ZipFile(content if hasattr(content, 'seek') else BytesIO(content), 'r')
+
+    @staticmethod
+    def if_preliminary_content(content):
+        with CmeParser.open_zip(content) as zip_file:
+            return CmeParser.if_preliminary_zip(zip_file)
+
+    @staticmethod
+    def read_sections(content, archive_files, index=None):
+        """
+        Extracts archive_files from the bulletin zip (bytes or a memory map) in one pass,
+        returns None if the bulletin is preliminary
+        """
+        index = index or PdfIndex()
+
+        if index.get('preliminary', lambda: CmeParser.if_preliminary_content(content)):
+            return None
+
+        with CmeParser.open_zip(content) as zip_file:
+            return {archive_file: zip_file.read(archive_file) for archive_file in set(archive_files)}
+
     def map_content(self, content):
-        with ZipFile(BytesIO(content), 'r') as zip_file:
-            if CmeParser.if_preliminary_zip(zip_file):
-                raise ValueError
+        archive_file = self.pdf_helper.other_info['archive_file']
+        sections = CmeParser.read_sections(content, [archive_file])
+
+        if sections is None:
+            raise ValueError
+
+        return sections[archive_file]
 
-            return zip_file.read(self.pdf_helper.other_info['archive_file'])
+    def config(self, content, pages=None):
+        if pages is None:
+            pages = pages_run(get_page_texts(BytesIO(content)), self.pdf_helper.name.active)
 
-    def config(self, content):
         return [
             {
-                'pages': list(zip(get_pages_run(BytesIO(content), self.pdf_helper.name.active),
-                                  repeat(self.parser_config['page_area']))),
+                'pages': list(zip(pages, repeat(self.parser_config['page_area']))),
                 'processors': [
                     {
+                        'batch': True,
                         'kwargs': {
                             'guess': False,
                             'pandas_options': {'header': None},
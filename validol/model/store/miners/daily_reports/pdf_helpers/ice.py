@@ -11,13 +11,14 @@ class IceParser(DailyPdfParser):
     def parsing_map(self):
         raise NotImplementedError
 
-    def config(self, content):
+    def config(self, content, pages=None):
         name_processor = {
             'kwargs': {'lattice': True},
             'postprocessor': lambda df: pd.DataFrame([df.iloc[i].name for i in range(len(df))])
         }
 
         plain_processor = {
+            'batch': True,
             'kwargs': {'lattice': True, 'pandas_options': {'header': None}}
         }
 
@@ -1,10 +1,14 @@
 import datetime as dt
 import re
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 from validol.model.mine.downloader import read_url_text
-from validol.model.store.resource import Resource
+from validol.model.store.resource import Resource, Table
+from validol.model.utils.utils import to_timestamp
 from validol.model.store.structures.structure import NamedStructure, Base, with_session
 from sqlalchemy import Column, String
 
@@ -67,6 +71,8 @@ class InvestingPrices(NamedStructure):
 class InvestingPrice(Resource):
     SCHEMA = [("Quot", "REAL")]
     INDEPENDENT = False
+    ROW = re.compile(r'class="first left bold noWrap">([^<]*)</td>'
+                     r'(?:(?!</tr>).)*?class="(?:green|red)Font">(\d+(?:\.\d*)*,\d*)</td>', re.DOTALL)
 
     def __init__(self, model_launcher, pair_id):
         Resource.__init__(self, model_launcher.main_dbh, "pair_id_{pair_id}".format(pair_id=pair_id),
@@ -77,19 +83,15 @@ class InvestingPrice(Resource):
     def update(self):
         raise NotImplementedError
 
-    def fill(self, first, last):
-        start_date = first.strftime("%d/%m/%Y")
-        end_date = last.strftime("%d/%m/%Y")
-
-        session = requests.Session()
-
+    @staticmethod
+    def download(session, pair_id, first, last):
         response = session.post(
             url='https://ru.investing.com/instruments/HistoricalDataAjax',
             data={
                 'action': 'historical_data',
-                'curr_id': self.pair_id,
-                'st_date': start_date,
-                'end_date': end_date,
+                'curr_id': pair_id,
+                'st_date': first.strftime("%d/%m/%Y"),
+                'end_date': last.strftime("%d/%m/%Y"),
                 'interval_sec': 'Daily'
             },
             headers={
@@ -98,33 +100,126 @@ class InvestingPrice(Resource):
             }
         )
 
-        df = pd.DataFrame()
+        df = pd.DataFrame(InvestingPrice.ROW.findall(response.text), columns=['Date', 'Quot'])
+
+        df['Date'] = pd.to_datetime(df.Date, format='%d.%m.%Y').dt.date
+        df['Quot'] = pd.to_numeric(df.Quot.map(lambda quot: quot.replace('.', '').replace(',', '.')))
 
-        df["Date"] = [dt.datetime.strptime(date, "%d.%m.%Y").date()
-                        for date in re.findall(
-                r'class="first left bold noWrap">(.*)</td>', response.text)]
+        return df
 
-        raw_prices = re.findall(
-            r'<td.*class="(green|red)Font">(\d+(\.\d*)*(,\d*))</td>',
-            response.text)
+    def fill(self, first, last):
+        with requests.Session() as session:
+            return InvestingPrice.download(session, self.pair_id, first, last)
+
+
+class PriceWatermarks(Table):
+    """
+    For every pair: the earliest date its history was requested from and the day
+    it was last fetched
+    """
+    def __init__(self, dbh):
+        Table.__init__(self, dbh, "PriceWatermarks", [
+            ("PairId", "TEXT PRIMARY KEY ON CONFLICT REPLACE"),
+            ("First", "INTEGER"),
+            ("Checked", "INTEGER")])
+
+    def get(self, pair_ids):
+        if not pair_ids:
+            return {}
 
-        df["Quot"] = [row[1].replace(".", "").replace(",", ".") for row in raw_prices]
+        rows = self.dbh.cursor().execute('''
+            SELECT
+                *
+            FROM
+                "{table}"
+            WHERE
+                PairId IN ({params})'''.format(table=self.table, params=",".join("?" * len(pair_ids))),
+            pair_ids).fetchall()
 
-        return df
+        return {pair_id: tuple(dt.date.fromtimestamp(ts) for ts in (first, checked))
+                for pair_id, first, checked in rows}
+
+    def set(self, values):
+        self.write([(pair_id, to_timestamp(first), to_timestamp(checked)) for pair_id, first, checked in values])
+        self.dbh.commit()
+
+
+class InvestingPriceService:
+    """
+    Prices of several pairs at once. A pair is fetched at most once per trading day,
+    the missing ranges of all pairs are downloaded concurrently over one session.
+    Only the downloads run in the pool, the database is written from the calling thread.
+    """
+    WORKERS = 4
+
+    def __init__(self, model_launcher):
+        self.model_launcher = model_launcher
+        self.watermarks = PriceWatermarks(model_launcher.main_dbh)
+
+    @staticmethod
+    def fresh(checked, today):
+        last_trading_day = np.busday_offset(today, 0, roll='backward').astype(dt.date)
+
+        return checked is not None and (checked >= today or checked > last_trading_day)
 
-    def read_dates(self, begin, end):
-        first, last = self.range()
+    def gaps(self, price, begin, end, watermark, today):
+        first, checked = watermark
 
+        if first is None:
+            return [(begin, end)]
+
+        gaps = []
+
+        if begin < first:
+            gaps.append((begin, first - dt.timedelta(days=1)))
+
+        if not InvestingPriceService.fresh(checked, today):
+            gaps.append((price.range()[1] or first, end))
+
+        return gaps
+
+    @staticmethod
+    def first(begin, watermark):
+        return begin if watermark is None else min(begin, watermark[0])
+
+    @staticmethod
+    def download(session, job):
         try:
-            if not first:
-                self.write_df(self.fill(begin, end))
-            else:
-                if begin < first:
-                    self.write_df(self.fill(begin, first - dt.timedelta(days=1)))
-                if last <= end:
-                    self.write_df(self.fill(last, end))
+            return InvestingPrice.download(session, *job)
         except requests.exceptions.ConnectionError:
-            pass
+            return None
+
+    def read(self, pairs):
+        """
+        pairs: {pair_id: (begin, end)}, returns {pair_id: prices df}
+        """
+        today = dt.date.today()
+
+        watermarks = self.watermarks.get(list(pairs))
+        prices = {pair_id: InvestingPrice(self.model_launcher, pair_id) for pair_id in pairs}
+
+        jobs = [(pair_id, first, last)
+                for pair_id, (begin, end) in pairs.items()
+                for first, last in self.gaps(prices[pair_id], begin, end,
+                                             watermarks.get(pair_id, (None, None)), today)]
+
+        if jobs:
+            with requests.Session() as session, ThreadPoolExecutor(InvestingPriceService.WORKERS) as executor:
+                session.mount('https://', HTTPAdapter(pool_maxsize=InvestingPriceService.WORKERS))
+
+                results = list(executor.map(lambda job: InvestingPriceService.download(session, job), jobs))
+
+            failed = set()
+
+            for (pair_id, _, _), df in zip(jobs, results):
+                if df is None:
+                    failed.add(pair_id)
+                else:
+                    prices[pair_id].write_df(df)
+
+            fetched = set(pair_id for pair_id, _, _ in jobs) - failed
 
-        return Resource.read_dates_dt(self, begin, end)
+            self.watermarks.set((pair_id, self.first(pairs[pair_id][0], watermarks.get(pair_id)), today)
+                                for pair_id in fetched)
 
+        return {pair_id: price.read_dates_dt(*pairs[pair_id]) for pair_id, price in prices.items()}
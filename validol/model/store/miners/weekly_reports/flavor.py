@@ -1,81 +1,242 @@
 import datetime as dt
-from io import StringIO
+import numpy as np
 import pandas as pd
 
-from validol.model.store.resource import Platforms, FlavorUpdater
-from validol.model.utils.utils import group_by
-from validol.model.store.miners.weekly_reports.active import WeeklyActives, Active
-from validol.model.store.miners.weekly_reports.utils import active_iterator
-from validol.model.store.utils import reduce_ranges
+from validol.model.store.resource import Table, Platforms, FlavorUpdater, Resource, ActiveResource, \
+    Ranges
+from validol.model.mine.downloader import ArchiveDownloader
+from validol.model.utils.utils import to_timestamp
+from validol.model.store.miners.weekly_reports.active import WeeklyActives
+from validol.model.store.miners.weekly_reports.utils import flavor_range
+from validol.model.store.utils import reduce_ranges, range_from_timestamp
+
+
+class FlavorStates(Table):
+    FIELDS = ('last_date', 'url', 'etag', 'last_modified')
+
+    def __init__(self, model_launcher):
+        Table.__init__(self, model_launcher.main_dbh, "FlavorStates", [
+            ("Flavor", "TEXT PRIMARY KEY"),
+            ("LastDate", "INTEGER"),
+            ("Url", "TEXT"),
+            ("ETag", "TEXT"),
+            ("LastModified", "TEXT")])
+
+    def get_state(self, flavor):
+        row = self.dbh.cursor().execute('''
+            SELECT
+                LastDate, Url, ETag, LastModified
+            FROM
+                "{table}"
+            WHERE
+                Flavor = ?'''.format(table=self.table), (flavor,)).fetchone()
+
+        return {} if row is None else dict(zip(FlavorStates.FIELDS, row))
+
+    def write_state(self, flavor, state):
+        self.dbh.cursor().execute('''
+            INSERT OR REPLACE INTO
+                "{table}"
+            VALUES
+                (?, ?, ?, ?, ?)'''.format(table=self.table),
+                                  [flavor] + [state.get(field) for field in FlavorStates.FIELDS])
+
+        self.dbh.commit()
 
 
 class Flavor(FlavorUpdater):
+    CHUNK_SIZE = 20000
+    NA_VALUES = ['.', '-', '']
+
+    def __init__(self, model_launcher, flavors):
+        FlavorUpdater.__init__(self, model_launcher, flavors)
+
+        self._downloader = None
+
+    @property
+    def downloader(self):
+        if self._downloader is None:
+            self._downloader = ArchiveDownloader()
+
+        return self._downloader
+
     @staticmethod
     def get_active_platform_name(market_and_exchange_names):
         return [name.strip() for name in market_and_exchange_names.rsplit("-", 1)]
 
     def flavor_latest_year(self, flavor):
-        curr_year = dt.date.today().year
-        fly = -1
-
-        for active in active_iterator(flavor, self.model_launcher):
-            fly = max(fly, active.range()[1].year)
-
-            if fly == curr_year:
-                return fly
+        last = flavor_range(flavor, self.model_launcher)[1]
 
-        return fly
+        return -1 if last is None else last.year
 
     def if_initial(self, flavor):
         return Platforms(self.model_launcher, flavor['name']).is_initial()
 
-    def get_df(self, flavor):
+    def begin_year(self, flavor, state):
+        if self.if_initial(flavor):
+            return None
+        elif state.get('last_date') is not None:
+            return dt.date.fromtimestamp(state['last_date']).year
+        else:
+            return self.flavor_latest_year(flavor)
+
+    def load_csvs(self, flavor, state):
+        """
+        Yields (file-like csv, date format) pairs of archives changed since the state
+        was recorded. State keeps the validators of the latest archive, so only that one
+        is skipped when unchanged, earlier ones are read and filtered by last_date.
+        """
+        sources = self.sources(flavor, self.begin_year(flavor, state))
+
+        paths = self.downloader.fetch_all((url, revalidate) for url, revalidate, _ in sources)
+
+        for (url, revalidate, date_fmt), path in zip(sources, paths):
+            if path is None:
+                continue
+
+            if revalidate:
+                validators = self.downloader.read_meta(url)
+
+                if any(validators.values()) and state.get('url') == url and \
+                        all(state.get(key) == value for key, value in validators.items()):
+                    continue
+
+                state.update(validators, url=url)
+
+            with self.open_csv(path) as csv:
+                if csv is not None:
+                    yield csv, date_fmt
+
+    def get_chunks(self, flavor, state):
         cols = flavor["keys"] + \
                list(flavor["values"].keys()) + \
                flavor.get("add_cols", [])
 
-        df = pd.DataFrame()
+        values = [col for col in flavor["values"].keys() if col != flavor["date"]]
 
-        for csv, date_fmt in self.load_csvs(flavor):
-            df = df.append(pd.read_csv(
-                StringIO(csv),
-                usecols=cols,
-                parse_dates=[flavor["date"]],
-                date_parser=lambda date: dt.datetime.strptime(date, date_fmt).date()))
+        dtype = {col: str for col in flavor["keys"] + flavor.get("add_cols", [])}
+        dtype[flavor["date"]] = str
 
-        df = df.rename(str, flavor["values"])
+        last_date = state.get('last_date')
+        if last_date is not None:
+            last_date = dt.date.fromtimestamp(last_date)
 
-        df[flavor["keys"]] = df[flavor["keys"]].applymap(lambda x: x.strip())
+        for csv, date_fmt in self.load_csvs(flavor, state):
+            for df in pd.read_csv(csv, usecols=cols, dtype=dtype, na_values=Flavor.NA_VALUES,
+                                  chunksize=Flavor.CHUNK_SIZE):
+                df[flavor["date"]] = pd.to_datetime(df[flavor["date"]], format=date_fmt).dt.date
 
-        return df
+                for col in values:
+                    if not pd.api.types.is_numeric_dtype(df[col]):
+                        df[col] = pd.to_numeric(df[col], errors='coerce')
 
-    def process_flavor(self, df, flavor):
-        info = group_by(df, flavor["keys"])
+                df = df.rename(str, flavor["values"])
 
-        actives_table = WeeklyActives(self.model_launcher, flavor['name'])
-        platforms_table = Platforms(self.model_launcher, flavor['name'])
+                if last_date is not None:
+                    df = df[df.Date > last_date]
+
+                for key in flavor["keys"]:
+                    df[key] = df[key].str.strip()
+
+                yield self.prepare_chunk(df, flavor)
+
+    def update_flavor(self, flavor):
+        states = FlavorStates(self.model_launcher)
+        state = states.get_state(flavor['name'])
+
+        result = self.process_chunks(self.get_chunks(flavor, state), flavor)
+
+        last = flavor_range(flavor, self.model_launcher)[1]
+        if last is not None:
+            state['last_date'] = to_timestamp(last)
+
+        states.write_state(flavor['name'], state)
+
+        return result
+
+    def process_chunks(self, chunks, flavor):
+        watermarks = {}
+
+        return reduce_ranges([self.process_flavor(df, flavor, watermarks)
+                              for df in chunks if not df.empty])
+
+    def write_platforms_actives(self, df, flavor):
+        names = df[flavor["keys"]].drop_duplicates()
 
         platforms = set()
         actives = set()
 
-        for code, name in info.groups.keys():
+        for code, name in names.itertuples(index=False):
             active_name, platform_name = Flavor.get_active_platform_name(name)
             platforms.add((code, platform_name))
             actives.add((code, active_name))
 
+        actives_table = WeeklyActives(self.model_launcher, flavor['name'])
+        platforms_table = Platforms(self.model_launcher, flavor['name'])
+
         for table, columns, values in (
                 (platforms_table, ("PlatformCode", "PlatformName"), platforms),
                 (actives_table, ("PlatformCode", "ActiveName"), actives)):
             table.write_df(pd.DataFrame(list(values), columns=columns))
 
-        ranges = []
+        return actives_table.get_ids(platforms_table)
+
+    def process_flavor(self, df, flavor, watermarks=None):
+        if watermarks is None:
+            watermarks = {}
+
+        dbh = self.model_launcher.main_dbh
+        ids = self.write_platforms_actives(df, flavor)
 
-        for code, name in info.groups.keys():
-            active_name, _ = Flavor.get_active_platform_name(name)
-            ranges.append(Active(self.model_launcher, flavor, code, active_name,
-                                 info.get_group((code, name))).update())
+        code, name = flavor["keys"]
+        df = df.assign(PlatformCode=df[code],
+                       ActiveName=df[name].map(lambda x: Flavor.get_active_platform_name(x)[0]))
+        df = df.merge(ids, on=["PlatformCode", "ActiveName"])
 
-        return reduce_ranges(ranges)
+        df["table"] = [ActiveResource.table_name(platform_id, active_id, flavor["name"])
+                       for platform_id, active_id in zip(df.platform_id, df.active_id)]
 
-    def load_csvs(self, flavor):
+        ranges = Ranges(dbh)
+
+        tables = [table for table in df.table.unique() if table not in watermarks]
+        for table in tables:
+            Resource(dbh, table, flavor["schema"])
+        watermarks.update((table, last) for table, (_, last) in ranges.get_ranges(tables).items())
+
+        timestamps = {date: to_timestamp(date) for date in df.Date.unique()}
+        df["Date"] = df.Date.map(timestamps)
+
+        last = pd.to_numeric(df.table.map(watermarks)).fillna(-np.inf)
+        df = df[(df.Date > last) & (df.Date <= to_timestamp(dt.date.today()))]
+
+        if df.empty:
+            return [None, None]
+
+        columns = ["Date"] + Resource.get_atoms(flavor["schema"])
+
+        with dbh:
+            for table, content in df.groupby("table", sort=False):
+                values = content.reindex(columns=columns).astype(object)
+                dbh.cursor().executemany(
+                    'INSERT INTO "{table}" VALUES ({values_num})'.format(
+                        table=table, values_num=",".join("?" * len(columns))),
+                    values.where(pd.notnull(values), None).values.tolist())
+
+                ranges.refresh(table)
+
+        return range_from_timestamp([df.Date.min(), df.Date.max()])
+
+    def sources(self, flavor, begin_year):
+        """
+        Returns (url, revalidate, date format) of the archives to load starting with
+        begin_year, or of the whole history if begin_year is None.
+        Yearly archives are always revalidated: the one of the year before keeps getting
+        its late December reports after New Year.
+        """
+        raise NotImplementedError
+
+    def open_csv(self, path):
         raise NotImplementedError
+
+    def prepare_chunk(self, df, flavor):
+        return df
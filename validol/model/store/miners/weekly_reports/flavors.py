@@ -1,8 +1,9 @@
+from contextlib import contextmanager
 from datetime import date
 
-from validol.model.mine.downloader import read_url_one_filed_zip, read_url_text
+from validol.model.mine.downloader import open_one_filed_zip, UnescapedFile
 from validol.model.store.miners.weekly_reports.flavor import Flavor
-from validol.model.utils.utils import group_by, flatten
+from validol.model.utils.utils import flatten
 from validol.model.store.miners.daily_reports.moex import MOEX
 
 
@@ -212,45 +213,37 @@ class Cftc(Flavor):
     def __init__(self, model_launcher):
         Flavor.__init__(self, model_launcher, Cftc.FLAVORS)
 
-    def load_csvs(self, flavor):
+    def sources(self, flavor, begin_year):
         curr_year = date.today().year
 
-        if self.if_initial(flavor):
+        if begin_year is None:
             sources = [(
                 "{initial_prefix}{prev_year}.zip"
                     .format(initial_prefix=flavor["initial_prefix"],
                             prev_year=Cftc.LAST_YEAR),
-                True,
+                False,
                 flavor.get("initial_date_fmt", flavor['date_fmt']))]
 
-            begin = Cftc.LAST_YEAR + 1
+            begin_year = Cftc.LAST_YEAR + 1
         else:
             sources = []
-            begin = self.flavor_latest_year(flavor)
 
-        sources += [(
+        return sources + [(
             "{year_prefix}{year}.zip"
                 .format(year_prefix=flavor["year_prefix"],
                         year=year),
-            year != curr_year,
+            True,
             flavor['date_fmt']
-        ) for year in range(begin, curr_year + 1)]
+        ) for year in range(begin_year, curr_year + 1)]
 
-        result = []
-        for source, cache_enabled, date_fmt in sources:
-            content = read_url_one_filed_zip(source, cache_enabled)
-            if content is not None:
-                result.append((content, date_fmt))
-
-        return result
-
-    def update_flavor(self, flavor):
-        df = self.get_df(flavor)
+    def open_csv(self, path):
+        return open_one_filed_zip(path)
 
+    def prepare_chunk(self, df, flavor):
         if flavor["disaggregated"]:
             df = fix_atoms(df)
 
-        return self.process_flavor(df, flavor)
+        return df
 
 
 def ice(name, ice_flavor):
@@ -302,36 +295,22 @@ class Ice(Flavor):
     def __init__(self, model_launcher):
         Flavor.__init__(self, model_launcher, Ice.FLAVORS)
 
-        self.grouped_df = None
-
-    def load_csvs(self, flavor):
-        if self.if_initial(flavor):
-            begin = 2011
-        else:
-            begin = self.flavor_latest_year(flavor)
-
-        result = []
+    def sources(self, flavor, begin_year):
         curr_year = date.today().year
-        for year in range(begin, curr_year + 1):
-            content = read_url_text("https://www.theice.com/publicdocs/futures/COTHist{year}.csv"
-                                    .format(year=year), year != curr_year)
-            if content is not None:
-                result.append((content, flavor['date_fmt']))
-
-        return result
-
-    def prepare_update(self):
-        df = self.get_df(Ice.FLAVORS[0])
 
-        df = fix_atoms(df)
+        return [("https://www.theice.com/publicdocs/futures/COTHist{year}.csv".format(year=year),
+                 True,
+                 flavor['date_fmt']) for year in range(begin_year or 2011, curr_year + 1)]
 
-        self.grouped_df = group_by(df, ["FutOnly_or_Combined"])
+    @contextmanager
+    def open_csv(self, path):
+        with open(path, 'r', encoding='utf-8') as infile:
+            yield UnescapedFile(infile)
 
-    def update_flavor(self, flavor):
-        if self.grouped_df is None:
-            self.prepare_update()
+    def prepare_chunk(self, df, flavor):
+        df = df[df.FutOnly_or_Combined == flavor["ice_flavor"]]
 
-        return self.process_flavor(self.grouped_df.get_group(flavor["ice_flavor"]), flavor)
+        return fix_atoms(df.drop("FutOnly_or_Combined", axis=1))
 
 
 WEEKLY_REPORT_FLAVORS = flatten([exchange.FLAVORS for exchange in (Cftc, Ice)]) + [MOEX]
\ No newline at end of file
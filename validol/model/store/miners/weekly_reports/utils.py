@@ -1,5 +1,7 @@
 from validol.model.store.miners.weekly_reports.flavor_view import WeeklyReportView
-from validol.model.store.miners.weekly_reports.active import Active
+from validol.model.store.miners.weekly_reports.active import Active, WeeklyActives
+from validol.model.store.resource import Platforms, ActiveResource, Ranges
+from validol.model.store.utils import reduce_ranges, range_from_timestamp
 
 
 def active_iterator(flavor, model_launcher):
@@ -7,4 +9,17 @@ def active_iterator(flavor, model_launcher):
 
     for i, platform in view_flavor.platforms(model_launcher).iterrows():
         for j, active in view_flavor.actives(platform.PlatformCode, model_launcher).iterrows():
-            yield Active(model_launcher, flavor, platform.PlatformCode, active.ActiveName)
\ No newline at end of file
+            yield Active(model_launcher, flavor, platform.PlatformCode, active.ActiveName)
+
+
+def flavor_tables(flavor, model_launcher):
+    ids = WeeklyActives(model_launcher, flavor['name']).get_ids(Platforms(model_launcher, flavor['name']))
+
+    return [ActiveResource.table_name(platform_id, active_id, flavor['name'])
+            for platform_id, active_id in zip(ids.platform_id, ids.active_id)]
+
+
+def flavor_range(flavor, model_launcher):
+    ranges = Ranges(model_launcher.main_dbh).get_ranges(flavor_tables(flavor, model_launcher))
+
+    return reduce_ranges([range_from_timestamp(range) for range in ranges.values()])
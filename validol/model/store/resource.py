@@ -1,7 +1,9 @@
 import datetime as dt
+import sqlite3
 import pandas as pd
 import numpy as np
 from functools import wraps
+from threading import Lock
 
 from validol.model.utils.utils import date_to_timestamp, to_timestamp
 from validol.model.store.utils import range_from_timestamp
@@ -55,6 +57,98 @@ class Table:
         '''.format(table=self.table))
 
 
+class Ranges(Table):
+    """
+    Every write to a data table goes through refresh/remove, so version counts the data
+    changes of the process and tells derived caches when they went stale,
+    versions does the same per table. Entries of tables older than the index are
+    backfilled by a migration, lookups of tables still missing scan them without writing
+    """
+    MAX_PARAMS = 500
+
+    version = 0
+    versions = {}
+    versions_lock = Lock()
+
+    @staticmethod
+    def changed(table):
+        with Ranges.versions_lock:
+            Ranges.version += 1
+            Ranges.versions[table] = Ranges.versions.get(table, 0) + 1
+
+    @staticmethod
+    def table_version(table):
+        return Ranges.versions.get(table, 0)
+
+    def __init__(self, dbh):
+        Table.__init__(self, dbh, "Ranges", [
+            ("TableName", "TEXT PRIMARY KEY"),
+            ("First", "INTEGER"),
+            ("Last", "INTEGER"),
+            ("Rows", "INTEGER")])
+
+    def refresh(self, table):
+        self.dbh.cursor().execute('''
+            INSERT OR REPLACE INTO
+                "{table}"
+            SELECT
+                ?,
+                MIN(Date),
+                MAX(Date),
+                COUNT(*)
+            FROM
+                "{resource}"'''.format(table=self.table, resource=table), (table,))
+
+        Ranges.changed(table)
+
+    def remove(self, table):
+        self.dbh.cursor().execute('''
+            DELETE
+            FROM
+                "{table}"
+            WHERE
+                TableName = ?'''.format(table=self.table), (table,))
+
+        Ranges.changed(table)
+
+    def get_ranges(self, tables):
+        result = {}
+
+        for i in range(0, len(tables), Ranges.MAX_PARAMS):
+            batch = tables[i:i + Ranges.MAX_PARAMS]
+
+            result.update((table, (first, last)) for table, first, last in self.dbh.cursor().execute('''
+                SELECT
+                    TableName,
+                    First,
+                    Last
+                FROM
+                    "{table}"
+                WHERE
+                    TableName IN ({params})'''.format(table=self.table, params=",".join("?" * len(batch))),
+                batch))
+
+        for table in tables:
+            if table not in result:
+                result[table] = self.scan(table)
+
+        return result
+
+    def scan(self, table):
+        try:
+            return self.dbh.cursor().execute('''
+                SELECT
+                    MIN(Date),
+                    MAX(Date)
+                FROM
+                    "{table}"'''.format(table=table)).fetchone()
+        except sqlite3.OperationalError:
+            return None, None
+
+    def get_range(self, table):
+        return self.get_ranges([table])[table]
+
+
 class Updater:
     def __init__(self, model_launcher):
         self.model_launcher = model_launcher
@@ -164,16 +258,10 @@ class Resource(Table, Updatable):
                        pre_dump, post_load)
         Updatable.__init__(self)
 
-    def range(self):
-        c = self.dbh.cursor()
-        c.execute('''
-        SELECT
-            MIN(Date),
-            MAX(Date)
-        FROM
-            "{table}"'''.format(table=self.table))
+        self.ranges = Ranges(dbh)
 
-        return range_from_timestamp(c.fetchone())
+    def range(self):
+        return range_from_timestamp(self.ranges.get_range(self.table))
 
     def empty(self):
         return pd.DataFrame(columns=[name for name, _ in self.schema],
@@ -224,6 +312,15 @@ class Resource(Table, Updatable):
 
         super().write_df(df)
 
+        self.ranges.refresh(self.table)
+        self.dbh.commit()
+
+    def drop(self):
+        super().drop()
+
+        self.ranges.remove(self.table)
+        self.dbh.commit()
+
     def write_update(self, data):
         self.write_df(data)
 
@@ -327,6 +424,20 @@ class Actives(Table):
 
         self.dbh.commit()
 
+    def get_ids(self, platforms_table):
+        return self.read_df('''
+            SELECT
+                actives.PlatformCode,
+                actives.ActiveName,
+                actives.id AS active_id,
+                platforms.id AS platform_id
+            FROM
+                "{{table}}" AS actives
+            JOIN
+                "{platforms}" AS platforms
+            ON
+                actives.PlatformCode = platforms.PlatformCode'''.format(platforms=platforms_table.table))
+
 
 class ActiveResource(Resource):
     def __init__(self, schema, model_launcher, platform_code, active_name, flavor,
@@ -336,12 +447,16 @@ class ActiveResource(Resource):
         platform_id = platforms_cls(model_launcher, actives_flavor or flavor).get_platform_id(platform_code)
 
         Resource.__init__(self, model_launcher.main_dbh,
-                          "Active_platform_{platform_id}_active_{active_id}_{flavor}".format(
-                              platform_id=platform_id,
-                              active_id=active_id,
-                              flavor=flavor),
+                          ActiveResource.table_name(platform_id, active_id, flavor),
                           schema, modifier, pre_dump, post_load)
 
+    @staticmethod
+    def table_name(platform_id, active_id, flavor):
+        return "Active_platform_{platform_id}_active_{active_id}_{flavor}".format(
+            platform_id=platform_id,
+            active_id=active_id,
+            flavor=flavor)
+
 
 def check_empty(f):
     @wraps(f)
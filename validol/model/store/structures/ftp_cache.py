@@ -1,39 +1,239 @@
-from sqlalchemy import Column, String, LargeBinary
-from io import BytesIO
-from ftplib import FTP
+import hashlib
+import mmap
+import os
+import time
+from contextlib import contextmanager
+from sqlalchemy import Column, String, Integer, Float, func
 
-from validol.model.store.structures.structure import NamedStructure, Base
+from validol.model.store.structures.structure import NamedStructure, Base, with_session
+from validol.model.mine.ftp import ftp_pool
 
 
 class FtpCacheEntry(Base):
-    __tablename__ = 'ftp'
+    __tablename__ = 'ftp_blobs'
     name = Column(String, primary_key=True)
-    value = Column(LargeBinary)
+    digest = Column(String, index=True)
+    size = Column(Integer)
+    accessed = Column(Float)
 
-    @staticmethod
-    def load(ftp_server, file):
-        with FTP(ftp_server) as ftp:
-            ftp.login()
-            data = BytesIO()
-            ftp.retrbinary('RETR {}'.format(file), data.write)
 
-        return FtpCacheEntry(name=file, value=data.getvalue())
+class FtpCache(NamedStructure):
+    """
+    Downloaded files are kept in a content-addressed directory, only a small
+    name -> digest index lives in cache.sqlite. Blobs are opened memory-mapped,
+    checked against their digest once per process and evicted by age and total size.
+    """
+    DIRECTORY = 'ftp_cache'
+    MAX_SIZE = 4 << 30
+    MAX_AGE = 180 * 24 * 3600
+    TOUCH_PERIOD = 24 * 3600
+    CHUNK_SIZE = 1 << 16
 
+    verified = set()
 
-class FtpCache(NamedStructure):
-    def __init__(self, model_launcher):
+    def __init__(self, model_launcher, directory=DIRECTORY):
         NamedStructure.__init__(self, FtpCacheEntry, model_launcher, model_launcher.cache_engine)
 
-    def get(self, ftp_server, file, with_cache=True):
-        if with_cache:
+        self.directory = directory
+
+    def path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def index_path(self, digest):
+        """
+        Where facts derived from the blob are kept, removed together with the blob
+        """
+        return self.path(digest) + '.index'
+
+    def download(self, write):
+        """
+        Stores the content fed by write(callback) as a blob, returns (digest, size).
+        Touches no index, so it is safe to call from several threads.
+        """
+        tmp_path = os.path.join(self.directory, '{}.{}.tmp'.format(os.getpid(), id(write)))
+        os.makedirs(self.directory, exist_ok=True)
+
+        sha1 = hashlib.sha1()
+
+        try:
+            with open(tmp_path, 'wb') as outfile:
+                def callback(chunk):
+                    sha1.update(chunk)
+                    outfile.write(chunk)
+
+                write(callback)
+
+            digest = sha1.hexdigest()
+            path = self.path(digest)
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        FtpCache.verified.add(digest)
+
+        return digest, os.path.getsize(path)
+
+    def index(self, name, digest, size):
+        entry = FtpCacheEntry(name=name, digest=digest, size=size, accessed=time.time())
+        self.write(entry)
+
+        return entry
+
+    def store(self, name, write):
+        entry = self.index(name, *self.download(write))
+
+        self.evict()
+
+        return entry
+
+    @staticmethod
+    def retriever(ftp_server, file):
+        return lambda callback: ftp_pool(ftp_server).retrieve(file, callback)
+
+    def load(self, ftp_server, file):
+        return self.store(file, FtpCache.retriever(ftp_server, file))
+
+    def prefetch(self, ftp_server, files):
+        """
+        Downloads the files missing in the cache concurrently over the pooled connections
+        """
+        missing = [file for file in files if self.lookup(file) is None]
+
+        def download(file):
             try:
-                return self.read_by_name(file).value
-            except:
-                obj = FtpCacheEntry.load(ftp_server, file)
+                return self.download(FtpCache.retriever(ftp_server, file))
+            except Exception as e:
+                print(e)
+
+                return None
+
+        for file, blob in zip(missing, ftp_pool(ftp_server).map(download, missing)):
+            if blob is not None:
+                self.index(file, *blob)
+
+        if missing:
+            self.evict()
+
+    def write_value(self, name, value):
+        return self.store(name, lambda callback: callback(value))
+
+    def check(self, entry):
+        path = self.path(entry.digest)
 
-                self.write(obj)
+        if not os.path.isfile(path) or os.path.getsize(path) != entry.size:
+            return False
+
+        if entry.digest not in FtpCache.verified:
+            sha1 = hashlib.sha1()
+
+            with open(path, 'rb') as infile:
+                for chunk in iter(lambda: infile.read(FtpCache.CHUNK_SIZE), b''):
+                    sha1.update(chunk)
+
+            if sha1.hexdigest() != entry.digest:
+                return False
+
+            FtpCache.verified.add(entry.digest)
+
+        return True
+
+    @with_session
+    def lookup(self, session, name):
+        entry = session.query(FtpCacheEntry).get(name)
+
+        if entry is not None and time.time() - entry.accessed > FtpCache.TOUCH_PERIOD:
+            entry.accessed = time.time()
+
+        return entry
+
+    def entry(self, ftp_server, file, with_cache=True):
+        if with_cache:
+            entry = self.lookup(file)
+
+            if entry is not None:
+                if self.check(entry):
+                    return entry
+
+                self.remove_by_name(file)
+
+        return self.load(ftp_server, file)
+
+    @contextmanager
+    def open_entry(self, entry):
+        with open(self.path(entry.digest), 'rb') as infile, \
+                mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            yield content
+
+    @contextmanager
+    def open(self, ftp_server, file, with_cache=True):
+        """
+        Yields a read-only memory map of the file, usable as a seekable file object
+        """
+        with self.open_entry(self.entry(ftp_server, file, with_cache)) as content:
+            yield content
+
+    def get(self, ftp_server, file, with_cache=True):
+        with self.open(ftp_server, file, with_cache) as content:
+            return content[:]
+
+    @contextmanager
+    def open_any(self):
+        """
+        Yields a memory map of some cached file, None if the cache is empty
+        """
+        entry = self.one_or_none()
+
+        if entry is None or not self.check(entry):
+            yield None
         else:
-            obj = FtpCacheEntry.load(ftp_server, file)
+            with self.open_entry(entry) as content:
+                yield content
+
+    def remove_blob(self, session, digest):
+        if session.query(FtpCacheEntry).filter(FtpCacheEntry.digest == digest).count() == 0:
+            for path in (self.path(digest), self.index_path(digest)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    @with_session
+    def remove_entries(self, session, entries):
+        for entry in entries:
+            session.query(FtpCacheEntry).filter(FtpCacheEntry.name == entry.name).delete()
+
+        session.flush()
+
+        for digest in set(entry.digest for entry in entries):
+            self.remove_blob(session, digest)
+
+    def remove_by_name(self, name):
+        self.remove_entries(self.read_all_by_name(name))
+
+    @with_session
+    def total_size(self, session):
+        sizes = session.query(FtpCacheEntry.digest, func.max(FtpCacheEntry.size)) \
+            .group_by(FtpCacheEntry.digest).all()
+
+        return sum(size for _, size in sizes)
+
+    def evict(self, max_size=MAX_SIZE, max_age=MAX_AGE):
+        entries = self.read(FtpCacheEntry.accessed < time.time() - max_age)
+        self.remove_entries(entries)
+
+        size = self.total_size()
+
+        if size > max_size:
+            entries = []
+
+            for entry in sorted(self.read(), key=lambda entry: entry.accessed):
+                if size <= max_size:
+                    break
 
-        return obj.value
+                entries.append(entry)
+                size -= entry.size
 
+            self.remove_entries(entries)
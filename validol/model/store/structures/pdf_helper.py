@@ -14,7 +14,7 @@ class PdfParser:
     def __init__(self, pdf_helper):
         self.pdf_helper = pdf_helper
 
-    def config(self, content):
+    def config(self, content, pages=None):
         raise NotImplementedError
 
     def map_content(self, content):
@@ -73,12 +73,13 @@ class PdfHelper(Base):
             return self.parse_content(file.read(), date)
 
     def parse_content(self, content, date):
-        content = self.processor.map_content(content)
+        return self.parse_mapped_content(self.processor.map_content(content), date)
 
+    def parse_mapped_content(self, content, date, pages=None):
         with TempFile() as file:
             file.write(content)
 
-            for config in self.processor.config(content):
+            for config in self.processor.config(content, pages):
                 if config['pages']:
                     try:
                         df = pdf(file.name, config)
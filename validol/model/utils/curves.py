@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+
+
+class Curves:
+    """
+    Ragged set of curves over dates: curve i has strikes[offsets[i]:offsets[i + 1]]
+    (ascending) and the matching values. A curve is stored as one packed float64 blob,
+    its strikes followed by its values.
+    """
+    def __init__(self, index, strikes, values, offsets):
+        self.index = index
+        self.strikes = strikes
+        self.values = values
+        self.offsets = offsets
+
+    @staticmethod
+    def pack(series):
+        return np.concatenate([series.index.values.astype(np.float64),
+                               series.values.astype(np.float64)]).tobytes()
+
+    @staticmethod
+    def to_blob(item):
+        if isinstance(item, str):
+            return Curves.pack(pd.read_json(item, typ='series', orient='split'))
+        else:
+            return item
+
+    @staticmethod
+    def from_blobs(index, blobs):
+        blobs = [Curves.to_blob(blob) for blob in blobs]
+
+        lengths = np.array([len(blob) // 16 for blob in blobs], dtype=np.int64)
+        offsets = np.r_[0, np.cumsum(lengths)]
+        data = np.frombuffer(b''.join(blobs), dtype=np.float64)
+
+        starts = offsets[:-1]
+        ids = np.repeat(np.arange(len(blobs)), lengths)
+        position = starts[ids] + np.arange(offsets[-1])
+
+        return Curves(index, data[position], data[position + lengths[ids]], offsets)
+
+    @staticmethod
+    def from_series(series):
+        curves = list(series.values)
+        lengths = [len(curve) for curve in curves]
+
+        def flat(arrays):
+            return np.concatenate(arrays).astype(np.float64) if arrays else np.array([], dtype=np.float64)
+
+        return Curves(series.index,
+                      flat([curve.index.values for curve in curves]),
+                      flat([curve.values for curve in curves]),
+                      np.r_[0, np.cumsum(lengths)].astype(np.int64))
+
+    @staticmethod
+    def of(param):
+        return param if isinstance(param, Curves) else Curves.from_series(param)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def nbytes(self):
+        return self.strikes.nbytes + self.values.nbytes + self.offsets.nbytes
+
+    def curve(self, i):
+        begin, end = self.offsets[i], self.offsets[i + 1]
+
+        return pd.Series(self.values[begin:end], index=self.strikes[begin:end])
+
+    def to_series(self):
+        return pd.Series([self.curve(i) for i in range(len(self))], index=self.index)
+
+    def padded(self):
+        """
+        Returns (strikes, values, lengths): dates x positions matrices, every curve
+        is left-aligned in its row and padded with NaN
+        """
+        lengths = np.diff(self.offsets)
+        width = lengths.max() if len(lengths) else 0
+
+        ids = np.repeat(np.arange(len(self)), lengths)
+        cols = np.arange(self.offsets[-1]) - self.offsets[:-1][ids]
+
+        strikes, values = np.full((2, len(self), width), np.nan)
+        strikes[ids, cols] = self.strikes
+        values[ids, cols] = self.values
+
+        return strikes, values, lengths
+
+    def argmin_positions(self, values):
+        if not values.size:
+            return np.zeros(len(self), dtype=np.int64)
+
+        return np.argmin(np.where(np.isnan(values), np.inf, values), axis=1)
+
+    def minimum(self):
+        """
+        Returns (strikes, values) at the minimum of every curve, NaN for empty curves
+        """
+        strikes, values, lengths = self.padded()
+
+        if not values.size:
+            return np.full((2, len(self)), np.nan)
+
+        rows = np.arange(len(self))
+        positions = self.argmin_positions(values)
+        empty = lengths == 0
+
+        return np.where(empty, np.nan, strikes[rows, positions]), np.where(empty, np.nan, values[rows, positions])
+
+    def min(self):
+        return pd.Series(self.minimum()[1], index=self.index)
+
+    def argmin(self):
+        return pd.Series(self.minimum()[0], index=self.index)
+
+    def quantile(self, q, minmax):
+        """
+        For every curve: the strike where the curve, walking away from its minimum
+        towards lower (minmax == 'min') or higher strikes, reaches min * (1 + q).
+        Interpolated linearly like np.interp, curves are assumed monotonic on each side.
+        """
+        strikes, values, lengths = self.padded()
+        result = np.full(len(self), np.nan)
+
+        if not values.size:
+            return pd.Series(result, index=self.index)
+
+        rows = np.arange(len(self))[:, None]
+        argmin = self.argmin_positions(values)[:, None]
+        steps = np.arange(values.shape[1])[None, :]
+
+        if minmax == 'min':
+            cols = argmin - steps
+            valid = cols >= 0
+        else:
+            cols = argmin + steps
+            valid = cols < lengths[:, None]
+
+        cols = np.clip(cols, 0, values.shape[1] - 1)
+        xp = np.where(valid, values[rows, cols], np.nan)
+        fp = np.where(valid, strikes[rows, cols], np.nan)
+
+        side = valid.sum(axis=1)
+        level = xp[:, 0] * (1 + q)
+
+        below = (valid & (xp <= level[:, None])).sum(axis=1)
+        left = np.clip(below - 1, 0, xp.shape[1] - 1)
+        right = np.clip(below, 0, xp.shape[1] - 1)
+        flat = rows[:, 0]
+
+        x0, x1 = xp[flat, left], xp[flat, right]
+        f0, f1 = fp[flat, left], fp[flat, right]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            interpolated = f0 + (level - x0) * (f1 - f0) / (x1 - x0)
+
+        result = np.where(below == 0, fp[:, 0],
+                          np.where(below >= side, fp[flat, np.clip(side - 1, 0, None)], interpolated))
+        result[side < 2] = np.nan
+
+        return pd.Series(result, index=self.index)
@@ -0,0 +1,45 @@
+import json
+import os
+
+
+class PdfIndex:
+    """
+    Facts about a bulletin computed once: the preliminary flag and the page runs of
+    actives in its sections. Kept in a small json file next to the FtpCache blob of the
+    bulletin and removed with it; without a path the index lives in memory only.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.data = {}
+
+        if path is not None:
+            try:
+                with open(path, 'r') as infile:
+                    self.data = json.load(infile)
+            except (IOError, ValueError):
+                pass
+
+    def get(self, field, compute):
+        if field not in self.data:
+            self.data[field] = compute()
+            self.save()
+
+        return self.data[field]
+
+    def runs(self, section):
+        return self.data.get('runs', {}).get(section, {})
+
+    def add_runs(self, section, runs):
+        self.data.setdefault('runs', {}).setdefault(section, {}).update(runs)
+        self.save()
+
+    def save(self):
+        if self.path is None:
+            return
+
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+
+        with open(tmp_path, 'w') as outfile:
+            json.dump(self.data, outfile)
+
+        os.replace(tmp_path, self.path)
@@ -13,6 +13,7 @@ from itertools import groupby
 from operator import itemgetter
 import re
 from contextlib import contextmanager
+from collections import OrderedDict
 
 
 def to_timestamp(date):
@@ -103,6 +104,32 @@ def group_by(df, columns):
     return df.groupby(columns, sort=False)[[col for col in df.columns if col not in columns]]
 
 
+def segment_ids(starts, size):
+    ids = np.zeros(size, dtype=np.int64)
+    ids[starts[1:]] = 1
+
+    return np.cumsum(ids)
+
+
+def segment_cumsum(values, starts):
+    """
+    Cumulative sums restarting at every index of starts (sorted, starts[0] == 0)
+    """
+    result = np.cumsum(values)
+    base = np.r_[0, result[starts[1:] - 1]]
+
+    return result - base[segment_ids(starts, len(values))]
+
+
+def segment_rcumsum(values, starts):
+    """
+    Cumulative sums from the end of every segment
+    """
+    totals = np.add.reduceat(values, starts)
+
+    return totals[segment_ids(starts, len(values))] - segment_cumsum(values, starts) + values
+
+
 def date_from_timestamp(df):
     result = df.copy()
     result.index = result.index.map(dt.date.fromtimestamp)
@@ -126,8 +153,46 @@ def remove_duplications(arr):
     return result
 
 
+def read_pdf_pages(fname, pages, area, processor):
+    return processor.get('postprocessor', lambda x: x)(
+        read_pdf(fname,
+                 pages=pages,
+                 area=area,
+                 encoding='cp1251' if os.name == 'nt' else 'utf-8',
+                 **processor['kwargs']))
+
+
+def pdf_pages(fname, pages, area, processors):
+    """
+    Every read_pdf call starts a JVM, so a run of pages sharing an area is first extracted
+    in one call by processors marked with 'batch'. If that fails pages are extracted
+    one by one trying every processor.
+    """
+    if len(pages) > 1:
+        for processor in processors:
+            if processor.get('batch', False):
+                try:
+                    return [read_pdf_pages(fname, pages, area, processor)]
+                except:
+                    pass
+
+    dfs = []
+
+    for i in pages:
+        for processor in processors:
+            try:
+                dfs.append(read_pdf_pages(fname, i, area, processor))
+                break
+            except:
+                pass
+        else:
+            raise ValueError
+
+    return dfs
+
+
 def pdf(fname, config):
-    df = pd.DataFrame()
+    jobs = []
 
     for page, area in config['pages']:
         if isinstance(page, int) or page == 'all':
@@ -137,27 +202,19 @@ def pdf(fname, config):
                           for x in page.split('-')]
             pgs = range(begin, end + 1)
 
-        for i in pgs:
-            success = False
+        jobs.extend((i, area) for i in pgs)
 
-            for processor in config['processors']:
-                try:
-                    df = df.append(processor.get('postprocessor', lambda x: x)(
-                        read_pdf(fname,
-                                 pages=i,
-                                 area=area,
-                                 encoding='cp1251' if os.name == 'nt' else 'utf-8',
-                                 **processor['kwargs'])))
-
-                    success = True
-                    break
-                except:
-                    pass
+    dfs = []
+
+    for area, group in groupby(jobs, itemgetter(1)):
+        pages = [page for page, _ in group]
+
+        if 'all' in pages:
+            pages = ['all']
 
-            if not success:
-                raise ValueError
+        dfs.extend(pdf_pages(fname, pages, area, config['processors']))
 
-    return df
+    return concat(dfs)
 
 
 def date_range(first, last):
@@ -179,20 +236,35 @@ def merge_dfs(dfa, dfb):
     return merged
 
 
-def merge_dfs_list(dfs):
-    result = dfs[0]
-    for df in dfs[1:]:
-        result = merge_dfs(result, df)
+def align_dfs(dfs):
+    """
+    merge_dfs over many frames at once: every column is reindexed a single time onto
+    the sorted union of all indexes, repeated columns keep the first non-NaN value
+    """
+    indexes = [df.index for df in dfs if not df.index.empty]
 
-    return result
+    if indexes:
+        index = reduce(lambda a, b: a.union(b), indexes[1:], indexes[0].unique()).sort_values() \
+            .rename(next((index.name for index in indexes if index.name is not None), None))
+    else:
+        index = pd.Index([])
+
+    columns = OrderedDict()
 
+    for df in dfs:
+        for col in df.columns:
+            values = df[col].reindex(index)
 
-def isfile(ftp, file):
-    try:
-        ftp.size(file)
-        return True
-    except:
-        return False
+            if col in columns:
+                columns[col] = columns[col].fillna(values)
+            else:
+                columns[col] = values
+
+    return pd.DataFrame(columns, index=index)
+
+
+def merge_dfs_list(dfs):
+    return align_dfs(dfs)
 
 
 def concat(dfs):
@@ -217,12 +289,17 @@ class TempFile:
         os.remove(self.name)
 
 
-def get_pages_run(fobj, phrase):
+def get_page_texts(fobj):
+    pfr = PdfFileReader(fobj)
+
+    return [pfr.getPage(page).extractText() for page in range(pfr.getNumPages())]
+
+
+def pages_run(texts, phrase):
     result = []
 
-    pfr = PdfFileReader(fobj)
-    for page in range(pfr.getNumPages()):
-        if phrase in pfr.getPage(page).extractText():
+    for page, text in enumerate(texts):
+        if phrase in text:
             result.append(page + 1)
         elif result:
             return result
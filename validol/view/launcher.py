@@ -9,6 +9,7 @@ from validol.view.graph.graphs import CheckedGraph
 from validol.view.menu.graph_dialog import GraphDialog
 from validol.view.menu.main_window import Window
 from validol.view.menu.table_dialog import TableDialog
+from validol.view.menu.evaluation_progress import EvaluationProgress
 from validol.view.table.tables import Table
 from validol.view.view_element import ViewElement
 from validol.view.menu.pdf_helper_dialog import PdfHelperDialog
@@ -39,6 +40,7 @@ class ViewLauncher(ViewElement):
         self.main_window = Window(self.app, self.controller_launcher, self.model_launcher)
 
         self.windows = set()
+        self.evaluations = set()
         self.qcron_manager = QCronManager(self.model_launcher, self)
 
         self.qcron_manager.refresh()
@@ -71,6 +73,14 @@ class ViewLauncher(ViewElement):
     def refresh_prices(self):
         self.main_window.set_cached_prices()
 
+    def show_evaluation_progress(self, task, title, on_done):
+        def done(task):
+            self.evaluations.discard(progress)
+            on_done(task)
+
+        progress = EvaluationProgress(task, title, done)
+        self.evaluations.add(progress)
+
     def show_table(self, data, labels, title):
         self.watch_window(Table(ViewLauncher.FLAGS, data, labels, title,
                                 self.controller_launcher, self.model_launcher))
@@ -112,6 +122,9 @@ class ViewLauncher(ViewElement):
         assert len(self.windows) == 0
 
     def quit(self):
+        for progress in self.evaluations.copy():
+            progress.task.cancel()
+
         self.app.quit()
 
     @staticmethod
@@ -0,0 +1,35 @@
+from PyQt5 import QtCore, QtWidgets
+
+
+class EvaluationProgress(QtWidgets.QProgressDialog):
+    progressed = QtCore.pyqtSignal(int, int)
+    evaluated = QtCore.pyqtSignal()
+
+    def __init__(self, task, title, on_done):
+        QtWidgets.QProgressDialog.__init__(self, 'Evaluating {}'.format(title), 'Cancel', 0, 0)
+
+        self.setWindowTitle('Table evaluation')
+        self.setWindowModality(QtCore.Qt.NonModal)
+        self.setMinimumDuration(500)
+        self.setAutoClose(False)
+        self.setAutoReset(False)
+
+        self.task = task
+        self.on_done = on_done
+
+        self.canceled.connect(self.task.cancel)
+        self.progressed.connect(self.on_progress)
+        self.evaluated.connect(self.on_evaluated)
+
+        self.task.add_progress_callback(self.progressed.emit)
+        self.task.add_done_callback(lambda task: self.evaluated.emit())
+
+    def on_progress(self, done, total):
+        self.setMaximum(total)
+        self.setValue(done)
+
+    def on_evaluated(self):
+        self.canceled.disconnect(self.task.cancel)
+        self.close()
+
+        self.on_done(self.task)